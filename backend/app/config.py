@@ -0,0 +1,80 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {name} must be an integer, got '{value}'")
+
+
+# image limits for scan requests
+MAX_IMAGE_BYTES = _env_int("MAX_IMAGE_BYTES", 10 * 1024 * 1024)
+MAX_IMAGE_PIXELS = _env_int("MAX_IMAGE_PIXELS", 4096 * 4096)
+
+# OCR micro-batching
+OCR_MAX_BATCH_SIZE = _env_int("OCR_MAX_BATCH_SIZE", 8)
+OCR_MAX_WAIT_MS = _env_int("OCR_MAX_WAIT_MS", 10)
+
+# 1 serves dictionary search only: no /api/scan routes, and torch and the OCR model are never loaded
+SEARCH_ONLY = _env_int("SEARCH_ONLY", 0)
+
+# OCR inference engine: torch, torch-int8 or onnx; see app/services/ocr_backends.py
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "torch")
+OCR_ONNX_DIR = os.environ.get("OCR_ONNX_DIR", str(Path(__file__).resolve().parent.parent / "data" / "ocr_onnx"))
+
+# snip preprocessing before OCR, see app/services/preprocess.py
+OCR_PREPROCESS = _env_int("OCR_PREPROCESS", 1)  # grayscale, crop blank borders, downscale
+OCR_SPLIT_REGIONS = _env_int("OCR_SPLIT_REGIONS", 0)  # also OCR each bubble of a multi-bubble snip separately
+
+# worker pools
+OCR_WORKERS = _env_int("OCR_WORKERS", 1)
+OCR_TORCH_THREADS = _env_int("OCR_TORCH_THREADS", 0)  # 0 keeps the default; also caps ONNX Runtime's threads
+SEARCH_WORKERS = _env_int("SEARCH_WORKERS", 4)
+
+# OCR job admission: beyond these, submissions get 429 with Retry-After instead of queueing
+OCR_JOB_QUEUE_SIZE = _env_int("OCR_JOB_QUEUE_SIZE", 64)  # pending jobs across all clients
+OCR_JOB_CLIENT_LIMIT = _env_int("OCR_JOB_CLIENT_LIMIT", 4)  # pending jobs per client
+OCR_JOB_ABANDON_SECONDS = _env_int("OCR_JOB_ABANDON_SECONDS", 30)  # pending jobs nobody polls for this long are cancelled
+OCR_JOB_RESULT_TTL_SECONDS = _env_int("OCR_JOB_RESULT_TTL_SECONDS", 300)  # finished jobs stay fetchable this long
+# 1 keys the per-client limit on the X-Client-Id header instead of the peer address. Clients choose
+# that header freely, so only turn this on behind a trusted proxy that sets it and strips clients' own
+OCR_TRUST_CLIENT_ID_HEADER = _env_int("OCR_TRUST_CLIENT_ID_HEADER", 0)
+
+# OCR result cache
+OCR_CACHE_MAX_BYTES = _env_int("OCR_CACHE_MAX_BYTES", 8 * 1024 * 1024)  # 0 disables the cache
+OCR_CACHE_PHASH_DISTANCE = _env_int("OCR_CACHE_PHASH_DISTANCE", 0)  # 0 disables near-duplicate matching
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", "")  # empty keeps the cache in memory only
+
+# search result cache, limits apply to each of the kanji and general caches
+SEARCH_CACHE_MAX_ENTRIES = _env_int("SEARCH_CACHE_MAX_ENTRIES", 2048)  # 0 disables caching
+SEARCH_CACHE_MAX_BYTES = _env_int("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+# sent as X-Admin-Token to POST /api/search/cache/invalidate; empty disables that route
+SEARCH_CACHE_ADMIN_TOKEN = os.environ.get("SEARCH_CACHE_ADMIN_TOKEN", "")
+
+# prebuilt kanji detail store, see app/services/kanji_store.py
+KANJI_STORE_PATH = os.environ.get("KANJI_STORE_PATH", str(Path(__file__).resolve().parent.parent / "data" / "kanji_store.sqlite"))
+
+# common JMdict words (priority-tagged) kept in memory for ranking and formatting general search results,
+# about 30k entries; see app/services/word_core.py
+WORD_CORE = _env_int("WORD_CORE", 1)
+
+# full-text index over English glosses, built on startup when missing; see app/services/gloss_index.py
+GLOSS_INDEX_PATH = os.environ.get("GLOSS_INDEX_PATH", str(Path(__file__).resolve().parent.parent / "data" / "gloss_index.sqlite"))
+
+# read-only connection pool for the jamdict database, see app/services/dictionary_db.py; at least 2,
+# so a lookup holding a connection while a lazily built index takes its own cannot wait on itself
+DICT_DB_POOL_SIZE = max(2, _env_int("DICT_DB_POOL_SIZE", SEARCH_WORKERS + 2))
+DICT_DB_MMAP_BYTES = _env_int("DICT_DB_MMAP_BYTES", 512 * 1024 * 1024)  # the whole ~310MB database; 0 disables mmap
+DICT_DB_CACHE_KIB = _env_int("DICT_DB_CACHE_KIB", 16 * 1024)  # page cache per connection
+DICT_DB_CACHED_STATEMENTS = _env_int("DICT_DB_CACHED_STATEMENTS", 256)  # prepared statements kept per connection
+
+# Per-request stage timings in a Server-Timing response header (browser devtools show them); off by default
+SERVER_TIMING_HEADER = _env_int("SERVER_TIMING_HEADER", 0)
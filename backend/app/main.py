@@ -1,11 +1,75 @@
 import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import scan
+from app import config
 from app.routers import search as search_router
+from app.services.executors import run_in_ocr_pool, run_in_search_pool, shutdown_executors
+from app.services.kanji_index import get_reading_index, get_word_index
+from app.services.gloss_index import ensure_gloss_index
+from app.services.suggest import get_suggest_index
+from app.services.word_core import get_word_core
+from app.services.search import general_cache
+from app.services.metrics import registry, begin_request_timings, STAGE_BUCKETS, QUERY_COUNT_BUCKETS
 
-app = FastAPI()
+# the scan side (PIL, fugashi, the OCR scheduler) is only imported when it is served;
+# torch and manga_ocr are imported lazily on first OCR use either way
+if not config.SEARCH_ONLY:
+    from app.routers import scan
+    from app.services.scan import warm_up_ocr_engine, get_ocr_status
+    from app.services.ocr_scheduler import ocr_scheduler
+    from app.services.ocr_jobs import ocr_jobs
+    from app.services.ocr_backends import check_backend
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not config.SEARCH_ONLY:
+        # a missing package would otherwise only surface in /api/health once loading fails
+        check_backend(config.OCR_BACKEND)
+
+    # load the model in the background so /api/health can report progress
+    async def _load_ocr():
+        try:
+            # warm up on the OCR pool so its torch thread limits apply
+            await run_in_ocr_pool(warm_up_ocr_engine)
+        except Exception as e:
+            logger.error(f"Failed to load OCR engine at startup: {e}", exc_info=True)
+
+    async def _build_search_indexes():
+        try:
+            await run_in_search_pool(get_reading_index)
+            await run_in_search_pool(get_word_index)
+            await run_in_search_pool(get_suggest_index)
+            await run_in_search_pool(get_word_core)
+            await run_in_search_pool(ensure_gloss_index)
+            # English queries answered before the gloss index was ready used the LIKE fallback
+            general_cache.invalidate()
+        except Exception as e:
+            logger.error(f"Failed to build search indexes at startup: {e}", exc_info=True)
+
+    tasks = [asyncio.create_task(_build_search_indexes())]
+    if not config.SEARCH_ONLY:
+        tasks.append(asyncio.create_task(_load_ocr()))
+        ocr_scheduler.start()
+        ocr_jobs.start()
+    yield
+    if not config.SEARCH_ONLY:
+        await ocr_jobs.stop()
+        await ocr_scheduler.stop()
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    shutdown_executors()
+
+
+app = FastAPI(lifespan=lifespan)
 
 load_dotenv()
 
@@ -13,7 +77,7 @@ load_dotenv()
 origins = [
     "http://localhost:1212",
     "http://localhost:5173",
-    os.environ.get("FRONTEND_URL", ""), 
+    os.environ.get("FRONTEND_URL", ""),
 ]
 
 origins = [origin for origin in origins if origin]
@@ -26,12 +90,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(scan.router, prefix="/api", tags=["scan"])
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    # set before the route runs so stage() and query counts from the pools land here
+    timings = begin_request_timings()
+    response = await call_next(request)
+    if request.url.path != "/metrics":
+        registry.histogram(
+            "request_duration_seconds", "Time from receiving a request until its response starts", STAGE_BUCKETS
+        ).observe(timings.elapsed())
+        registry.histogram(
+            "dictionary_queries_per_request", "Dictionary SQL statements run per request", QUERY_COUNT_BUCKETS
+        ).observe(timings.queries)
+    if config.SERVER_TIMING_HEADER:
+        response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
+if not config.SEARCH_ONLY:
+    app.include_router(scan.router, prefix="/api", tags=["scan"])
 app.include_router(search_router.router, prefix="/api", tags=["search"])
 
 @app.get("/")
 async def root():
     print("Hello World")
-    return {"message": "Hello World"} 
+    return {"message": "Hello World"}
+
+
+@app.get("/api/health")
+async def health():
+    if config.SEARCH_ONLY:
+        return {"status": "ok", "ocr": {"enabled": False}}
+    ocr_status = get_ocr_status()
+    status_code = 200 if ocr_status["ready"] else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "ok" if ocr_status["ready"] else "starting", "ocr": ocr_status},
+    )
+
 
 
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition: per-stage latency, OCR batching and query-count histograms
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,32 +1,409 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
 from pydantic import BaseModel
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import HTTPConnection
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+import asyncio
 import logging
+import json
 
-from app.services.scan import perform_ocr_on_image
+from app import config
+from app.services.scan import decode_image_data_url, decode_image_bytes, ImageDecodeError, ImageTooLargeError
+from app.services.ocr_scheduler import ocr_scheduler
+from app.services.ocr_cache import ocr_cache
+from app.services.ocr_jobs import ocr_jobs, JobRejectedError, OcrJob, PENDING, DONE
+from app.services.pipeline import run_scan_pipeline
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 router = APIRouter(prefix="/scan")
 
+ALLOWED_IMAGE_TYPES = {"image/png", "image/jpeg", "image/webp"}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# room for multipart boundaries and part headers on top of the image itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+# longest a job status request may hold on waiting for the result
+MAX_JOB_WAIT_SECONDS = 30
+
 class ImageData(BaseModel):
-    imageData: str 
+    imageData: str
+
+
+def _client_id(connection: HTTPConnection) -> str:
+    # the header is chosen by the caller, so it only counts when a trusted proxy in front sets it
+    if config.OCR_TRUST_CLIENT_ID_HEADER and connection.headers.get("x-client-id"):
+        return connection.headers["x-client-id"]
+    return connection.client.host if connection.client else "unknown"
+
+
+async def _decode(decode_fn: Callable[[Any], Any], payload: Any) -> Image.Image:
+    try:
+        return await asyncio.to_thread(decode_fn, payload)
+    except ImageTooLargeError as e:
+        logger.warning(f"Rejected oversized image: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageDecodeError as e:
+        logger.warning(f"Rejected invalid image data: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _submit_job(image: Image.Image, request: Request) -> OcrJob:
+    try:
+        return ocr_jobs.submit(image, _client_id(request))
+    except JobRejectedError as e:
+        logger.warning(f"Shedding OCR request: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def _translate(request: Request, decode_fn: Callable[[Any], Any], payload: Any) -> dict:
+    image = await _decode(decode_fn, payload)
+    job = _submit_job(image, request)
+    # wait in short steps so a client that hung up does not keep its job in the OCR queue
+    while job.status == PENDING:
+        await ocr_jobs.wait(job, timeout=1.0)
+        if job.status == PENDING and await request.is_disconnected():
+            logger.info(f"Client disconnected, cancelling OCR job {job.id}")
+            ocr_jobs.cancel(job.id)
+            raise HTTPException(status_code=503, detail="Client disconnected")
+
+    if job.status != DONE:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {job.error or job.status}")
+    return {
+        "message": "File processed successfully",
+        "translated_text": job.text,
+    }
+
+
+def _check_declared_length(request: Request, limit: int) -> None:
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload is {declared} bytes, limit is {limit} bytes.")
+
+
+async def _read_raw_body(request: Request) -> bytes:
+    _check_declared_length(request, config.MAX_IMAGE_BYTES)
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > config.MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds limit of {config.MAX_IMAGE_BYTES} bytes.")
+    return bytes(body)
+
+
+async def _capped_stream(request: Request, limit: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds limit of {limit} bytes.")
+        yield chunk
+
+
+async def _read_multipart_image(request: Request) -> bytes:
+    limit = config.MAX_IMAGE_BYTES + MULTIPART_OVERHEAD_BYTES
+    _check_declared_length(request, limit)
+    # the byte cap applies while the body is parsed, so a body without Content-Length is bounded too
+    parser = MultiPartParser(request.headers, _capped_stream(request, limit), max_files=1, max_fields=4)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=f"Invalid multipart upload: {e.message}")
+    try:
+        upload = next((value for value in form.values() if isinstance(value, UploadFile)), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Multipart upload contains no image file.")
+        if upload.content_type and upload.content_type not in ALLOWED_IMAGE_TYPES:
+            raise HTTPException(status_code=415, detail=f"Unsupported image type '{upload.content_type}'.")
+
+        body = bytearray()
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            body.extend(chunk)
+            if len(body) > config.MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds limit of {config.MAX_IMAGE_BYTES} bytes.")
+    finally:
+        await form.close()
+    return bytes(body)
+
+
+async def _read_upload(request: Request) -> bytes:
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+    if content_type in ALLOWED_IMAGE_TYPES:
+        image_bytes = await _read_raw_body(request)
+    elif content_type == "multipart/form-data":
+        image_bytes = await _read_multipart_image(request)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type '{content_type}'. Send image/png, image/jpeg, image/webp or multipart/form-data.",
+        )
+
+    if not image_bytes:
+        logger.error("Received empty image upload.")
+        raise HTTPException(status_code=400, detail="No image data received")
+    return image_bytes
+
 
-#  for now it just uses the one in /img
 @router.post("/translate")
-async def translate_image(img: ImageData):
+async def translate_image(img: ImageData, request: Request):
+    """
+    OCRs a snip and answers with its text. Goes through the same job queue
+    as /scan/jobs, so it is answered with 429 and Retry-After when OCR is
+    saturated.
+    """
+    if not img.imageData:
+        logger.error("Received empty image data.")
+        raise HTTPException(status_code=400, detail="No image data received")
+
+    return await _translate(request, decode_image_data_url, img.imageData)
+
+
+@router.post("/translate/upload")
+async def translate_image_upload(request: Request):
+    """
+    Same as /scan/translate, but takes the image as a raw image/png,
+    image/jpeg or image/webp body, or as a multipart/form-data file upload,
+    instead of a base64 data URL inside JSON.
+    """
+    return await _translate(request, decode_image_bytes, await _read_upload(request))
+
+
+def _job_accepted(job: OcrJob, request: Request) -> JSONResponse:
+    location = str(request.url_for("get_job", job_id=job.id))
+    return JSONResponse(status_code=202, content=job.to_dict(), headers={"Location": location})
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(img: ImageData, request: Request):
+    """
+    Queues a snip for OCR and returns its job id straight away. Fetch the
+    result from GET /scan/jobs/{job_id} or the /scan/jobs/{job_id}/ws
+    WebSocket. Answers 429 with Retry-After when the queue or this client's
+    share of it is full. A job nobody asks about for
+    OCR_JOB_ABANDON_SECONDS is cancelled.
+    """
     if not img.imageData:
         logger.error("Received empty image data.")
         raise HTTPException(status_code=400, detail="No image data received")
 
+    image = await _decode(decode_image_data_url, img.imageData)
+    return _job_accepted(_submit_job(image, request), request)
+
+
+@router.post("/jobs/upload", status_code=202)
+async def submit_job_upload(request: Request):
+    """Same as POST /scan/jobs, with the image sent the way /scan/translate/upload takes it."""
+    image = await _decode(decode_image_bytes, await _read_upload(request))
+    return _job_accepted(_submit_job(image, request), request)
+
+
+def _get_job(job_id: str) -> OcrJob:
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=MAX_JOB_WAIT_SECONDS)):
+    """
+    Status of a job: pending, done (with translated_text), failed or
+    cancelled. With wait, holds the request up to that many seconds for
+    the job to finish (long polling).
+    """
+    job = _get_job(job_id)
+    if wait:
+        await ocr_jobs.wait(job, timeout=wait)
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels a pending job so it never reaches the OCR workers."""
+    job = _get_job(job_id)
+    ocr_jobs.cancel(job_id)
+    # the cancellation lands on the job's next step
+    await ocr_jobs.wait(job, timeout=1.0)
+    return job.to_dict()
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def watch_job(websocket: WebSocket, job_id: str):
+    """
+    Sends the job's final state as one JSON message, then closes. If the
+    client goes away first and nobody else is watching, the job is
+    cancelled.
+    """
+    await websocket.accept()
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        await websocket.send_json({"job_id": job_id, "status": "unknown", "error": "Unknown or expired job id"})
+        await websocket.close()
+        return
+
+    finished = asyncio.ensure_future(ocr_jobs.wait(job))
+    try:
+        while not finished.done():
+            # messages from the client are ignored; only a disconnect matters
+            received = asyncio.ensure_future(websocket.receive())
+            await asyncio.wait({finished, received}, return_when=asyncio.FIRST_COMPLETED)
+            if not received.done():
+                received.cancel()
+            elif received.result()["type"] == "websocket.disconnect":
+                break
+        if finished.done():
+            await websocket.send_json(job.to_dict())
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        finished.cancel()
+        # let the cancelled wait() drop its watcher count
+        await asyncio.sleep(0)
+        if job.status == PENDING and not job.watchers:
+            logger.info(f"Job watcher left, cancelling OCR job {job.id}")
+            ocr_jobs.cancel(job.id)
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+
+class _JobFailedError(Exception):
+    pass
+
+
+class _ClientGoneError(Exception):
+    pass
+
+
+async def _stream_pipeline_events(
+    decode_fn: Callable[[Any], Any], payload: Any, client: str,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    try:
+        image = await asyncio.to_thread(decode_fn, payload)
+    except ImageTooLargeError as e:
+        yield {"event": "error", "data": {"status": 413, "detail": str(e)}}
+        return
+    except ImageDecodeError as e:
+        yield {"event": "error", "data": {"status": 400, "detail": str(e)}}
+        return
+
+    # OCR goes through the job queue like every other scan route, with the same admission limits
+    try:
+        job = ocr_jobs.submit(image, client)
+    except JobRejectedError as e:
+        logger.warning(f"Shedding OCR request: {e}")
+        yield {"event": "error", "data": {"status": 429, "detail": str(e), "retry_after": e.retry_after}}
+        return
+
+    async def _recognize(_image: Image.Image) -> str:
+        while job.status == PENDING:
+            await ocr_jobs.wait(job, timeout=1.0)
+            if job.status == PENDING and is_disconnected is not None and await is_disconnected():
+                raise _ClientGoneError()
+        if job.status != DONE:
+            raise _JobFailedError(job.error or job.status)
+        return job.text
+
     try:
-        extracted_text = perform_ocr_on_image(img.imageData)
-        return {
-            "message": "File processed successfully",
-            "translated_text": extracted_text,
-        }
-    except Exception as e: 
-        logger.error(f"Error during OCR processing: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        async for event in run_scan_pipeline(image, _recognize):
+            yield event
+    except _ClientGoneError:
+        pass
+    except _JobFailedError as e:
+        yield {"event": "error", "data": {"status": 500, "detail": f"Error processing image: {e}"}}
+    except Exception as e:
+        logger.error(f"Error during streaming scan: {e}", exc_info=True)
+        yield {"event": "error", "data": {"status": 500, "detail": f"Error processing image: {str(e)}"}}
+    finally:
+        # reached on disconnect too: the stream is cancelled or closed early
+        if job.status == PENDING:
+            logger.info(f"Scan stream closed, cancelling OCR job {job.id}")
+            ocr_jobs.cancel(job.id)
+
+
+@router.post("/stream")
+async def stream_scan(img: ImageData, request: Request):
+    """
+    Server-sent events version of /scan/translate. Streams the OCR text as
+    soon as it is ready, then the tokenized text, then dictionary results
+    for each word and kanji as they finish, then a final 'done' event.
+    When OCR is saturated the only event is an 'error' with status 429 and
+    retry_after in seconds.
+    """
+    if not img.imageData:
+        logger.error("Received empty image data.")
+        raise HTTPException(status_code=400, detail="No image data received")
+
+    async def _events():
+        events = _stream_pipeline_events(decode_image_data_url, img.imageData, _client_id(request), request.is_disconnected)
+        async for event in events:
+            yield _format_sse(event)
+
+    return StreamingResponse(_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def _send_events(websocket: WebSocket, events: AsyncIterator[Dict[str, Any]]) -> None:
+    async for event in events:
+        await websocket.send_json(event)
+
+
+@router.websocket("/ws")
+async def scan_websocket(websocket: WebSocket):
+    """
+    WebSocket version of /scan/stream. Each message is one snip, either a
+    base64 data URL as text or raw image bytes as binary; the server replies
+    with the same events as JSON messages {"event": ..., "data": ...}.
+    Snips are handled one at a time, and a disconnect cancels the OCR job of
+    the one in progress.
+    """
+    await websocket.accept()
+    client = _client_id(websocket)
+    next_message: Optional[asyncio.Future] = None
+    try:
+        while True:
+            message = await (next_message or websocket.receive())
+            next_message = None
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                events = _stream_pipeline_events(decode_image_bytes, message["bytes"], client)
+            elif message.get("text"):
+                events = _stream_pipeline_events(decode_image_data_url, message["text"], client)
+            else:
+                await websocket.send_json({"event": "error", "data": {"status": 400, "detail": "No image data received"}})
+                continue
+
+            # keep listening while the snip is processed, so a disconnect is noticed mid-OCR
+            sending = asyncio.ensure_future(_send_events(websocket, events))
+            next_message = asyncio.ensure_future(websocket.receive())
+            await asyncio.wait({sending, next_message}, return_when=asyncio.FIRST_COMPLETED)
+            if next_message.done() and next_message.result()["type"] == "websocket.disconnect":
+                sending.cancel()
+                await asyncio.gather(sending, return_exceptions=True)
+                break
+            # any other message is the next snip, handled once this one is done
+            await sending
+    except WebSocketDisconnect:
+        logger.info("Scan websocket closed by client.")
+    finally:
+        if next_message is not None and not next_message.done():
+            next_message.cancel()
 
 
+@router.get("/stats")
+async def get_scan_stats():
+    """
+    Reports OCR scheduler batch-size and queue-wait histograms, OCR result
+    cache hit/miss counters and job admission counters.
+    """
+    return {"scheduler": ocr_scheduler.stats(), "cache": ocr_cache.stats(), "jobs": ocr_jobs.stats()}
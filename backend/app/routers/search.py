@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from typing import List, Dict, Union, Optional, Literal
+import secrets
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
+from app import config
 from app.services.search import search_kanji as service_search_kanji
 from app.services.search import search_general as service_search_general
+from app.services.search import search_kanji_batch as service_search_kanji_batch
+from app.services.search import kanji_cache, general_cache
+from app.services.search import DEFAULT_GENERAL_PAGE_SIZE, MAX_GENERAL_PAGE_SIZE
+from app.services.kanji_index import is_kanji
+from app.services.suggest import suggest as service_suggest
+from app.services.suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+from app.services.kanji_store import get_kanji_store
+from app.services.executors import run_in_search_pool
+from app.services.dictionary_db import dictionary_pool
 
 router = APIRouter()
 
+MAX_BATCH_KANJI = 256
+
 class ExampleSentencesModel(BaseModel):
     word: str
     reading: str
@@ -40,6 +53,8 @@ class KanjiInfoResponse(BaseModel):
 
 class GeneralSearchQuery(BaseModel):
     query: str
+    limit: int = Field(DEFAULT_GENERAL_PAGE_SIZE, ge=1, le=MAX_GENERAL_PAGE_SIZE)
+    cursor: Optional[str] = None
 
 class FrontendExampleSentenceModel(BaseModel): 
     japanese: str
@@ -72,6 +87,31 @@ GeneralSearchResultItem = Union[WordResultItem, KanjiResultItem]
 
 class GeneralSearchResponse(BaseModel):
     results: List[GeneralSearchResultItem]
+    total: int = 0
+    has_more: bool = False
+    next_cursor: Optional[str] = None
+
+class SuggestionItem(BaseModel):
+    word: str
+    reading: str
+    meaning: str
+    matched: str
+    idseq: str
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[SuggestionItem]
+
+class KanjiBatchQuery(BaseModel):
+    query: Union[str, List[str]]
+
+class KanjiBatchItem(BaseModel):
+    kanji: str
+    found: bool
+    data: Optional[KanjiInfoResponse] = None
+
+class KanjiBatchResponse(BaseModel):
+    results: List[KanjiBatchItem]
 
 
 @router.get("/search/kanji/{term}", response_model=Optional[KanjiInfoResponse])
@@ -81,24 +121,108 @@ async def get_kanji_info(term: str):
     """
     if not term or len(term) != 1:
         raise HTTPException(status_code=400, detail="Please provide a single Kanji character.")
+
+    # the prebuilt store already holds the serialized response
+    store = get_kanji_store()
+    if store is not None:
+        payload = store.get_json(term)
+        if payload is not None:
+            return Response(content=payload, media_type="application/json")
     
-    kanji_data = service_search_kanji(term)
+    kanji_data = await run_in_search_pool(service_search_kanji, term)
     
     if kanji_data is None:
         raise HTTPException(status_code=404, detail=f"Kanji '{term}' not found.")
     
     return KanjiInfoResponse(**kanji_data)
 
+@router.post("/search/kanji/batch", response_model=KanjiBatchResponse)
+async def post_kanji_batch(query_body: KanjiBatchQuery):
+    """
+    Kanji details for many characters in one request. Takes either a string,
+    such as a whole OCR result, whose kanji are looked up, or an explicit list
+    of characters. Duplicates are dropped; results follow first appearance,
+    with found=false for characters that have no entry.
+    """
+    if isinstance(query_body.query, str):
+        characters = [char for char in query_body.query if is_kanji(char)]
+    else:
+        characters = [char for char in query_body.query if char]
+    characters = list(dict.fromkeys(characters))
+
+    if len(characters) > MAX_BATCH_KANJI:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_KANJI} distinct characters per batch.")
+    if not characters:
+        return KanjiBatchResponse(results=[])
+
+    # multi-character list items can never match, skip the lookup for them
+    lookups = await run_in_search_pool(service_search_kanji_batch, [char for char in characters if len(char) == 1])
+
+    results = []
+    for char in characters:
+        kanji_data = lookups.get(char)
+        results.append(KanjiBatchItem(
+            kanji=char,
+            found=kanji_data is not None,
+            data=KanjiInfoResponse(**kanji_data) if kanji_data is not None else None,
+        ))
+    return KanjiBatchResponse(results=results)
+
 @router.post("/search/general", response_model=GeneralSearchResponse)
 async def post_general_search(query_body: GeneralSearchQuery):
     """
     Performs a general search for words, kanji, kana, or English terms.
-    Returns a list of results, which can be word entries or detailed Kanji info.
+    Returns one page of results, most relevant first, which can be word
+    entries or detailed Kanji info. Pass next_cursor back as cursor to get
+    the following page.
     """
     if not query_body.query or not query_body.query.strip():
         return GeneralSearchResponse(results=[])
-        
-    search_results_data = service_search_general(query_body.query.strip())
+
+    try:
+        search_results_data = await run_in_search_pool(
+            service_search_general, query_body.query.strip(), query_body.limit, query_body.cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return search_results_data
 
+
+@router.get("/search/suggest", response_model=SuggestResponse)
+async def get_suggestions(q: str = "", limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS)):
+    """
+    Search-as-you-type completions for a prefix in kana, kanji or romaji
+    (romaji may end mid-syllable), most common words first.
+    """
+    if not q.strip():
+        return SuggestResponse(query=q, suggestions=[])
+    suggestions = await run_in_search_pool(service_suggest, q, limit)
+    return SuggestResponse(query=q, suggestions=suggestions)
+
+
+@router.get("/search/cache/stats")
+async def get_search_cache_stats():
+    """
+    Reports hit rate, size and eviction counters for the search result caches,
+    and how busy the dictionary connection pool is.
+    """
+    return {"kanji": kanji_cache.stats(), "general": general_cache.stats(), "connections": dictionary_pool.stats()}
+
+@router.post("/search/cache/invalidate")
+async def invalidate_search_cache(key: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Drops one cached query from both caches, or everything when no key is given.
+    Needs the X-Admin-Token header to match SEARCH_CACHE_ADMIN_TOKEN, and is
+    not served at all while that is unset.
+    """
+    if not config.SEARCH_CACHE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), config.SEARCH_CACHE_ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    return {
+        "kanji": kanji_cache.invalidate(key),
+        "general": general_cache.invalidate(key),
+    }
@@ -0,0 +1,167 @@
+"""
+Pre-forking launcher for running several workers on one machine:
+
+    python -m app.serve --workers 4 [--host 0.0.0.0] [--port 8000]
+
+`uvicorn --workers N` starts every worker as a fresh interpreter, so each
+loads its own copy of the OCR model and builds its own search indexes. Here
+the parent loads them once, binds the listening socket and then forks the
+workers, which share the parent's memory copy-on-write: model weights and
+index tables are only ever read, so their pages stay shared. The jamdict
+database and the prebuilt SQLite stores are memory-mapped read-only, so
+their pages are shared through the OS page cache either way.
+
+The parent never runs inference before forking. A torch (OpenMP) or ONNX
+Runtime thread pool started in the parent does not exist in its children,
+and a child that then runs inference hangs. So torch weights are loaded
+with a single intra-op thread and the warm-up inference happens in each
+worker, and the onnx backend, whose sessions start their pool on creation,
+is loaded by each worker rather than shared.
+
+The parent restarts workers that exit unexpectedly and passes SIGINT and
+SIGTERM on to all of them.
+"""
+from typing import Dict, Optional
+import argparse
+import logging
+import signal
+import socket
+import time
+import gc
+import os
+
+import uvicorn
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# a worker that dies sooner than this after starting is not restarted again straight away
+_RESPAWN_BACKOFF_S = 1.0
+
+# torch's intra-op thread count before preload pinned it to one, restored in each worker
+_torch_threads: Optional[int] = None
+
+
+def preload() -> None:
+    """Loads everything the workers can share: the dictionary, the search indexes and the OCR weights."""
+    global _torch_threads
+    from app.services.search import get_jam
+    from app.services.kanji_index import get_reading_index, get_word_index
+    from app.services.kanji_store import get_kanji_store
+    from app.services.suggest import get_suggest_index
+    from app.services.word_core import get_word_core
+    from app.services.gloss_index import ensure_gloss_index
+
+    start = time.perf_counter()
+    get_jam()
+    get_reading_index()
+    get_word_index()
+    get_suggest_index()
+    get_word_core()
+    ensure_gloss_index()
+    get_kanji_store()
+    logger.info(f"Search indexes loaded in {time.perf_counter() - start:.2f}s")
+
+    if not config.SEARCH_ONLY and config.OCR_BACKEND.startswith("torch"):
+        import torch
+        from app.services.scan import get_ocr_engine
+
+        # loading may run a first inference; with one thread no pool is started that the workers would lack
+        _torch_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        get_ocr_engine()
+
+    # everything loaded so far lives as long as the process; keep the collector
+    # from touching it, which would dirty the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+
+
+def _run_worker(sock: socket.socket, args: argparse.Namespace) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if _torch_threads is not None:
+        import torch
+        torch.set_num_threads(config.OCR_TORCH_THREADS if config.OCR_TORCH_THREADS > 0 else _torch_threads)
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level))
+    server.run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, args)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+
+def serve(args: argparse.Namespace) -> None:
+    if args.preload:
+        preload()
+    # imported here after preload too, so the app and its routers are part of what the workers share
+    from app.main import app  # noqa: F401
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers (preload {'on' if args.preload else 'off'})")
+
+    workers: Dict[int, float] = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    for _ in range(args.workers):
+        workers[_spawn(sock, args)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting it")
+        if time.monotonic() - started_at < _RESPAWN_BACKOFF_S:
+            time.sleep(_RESPAWN_BACKOFF_S)
+        if not stopping:
+            workers[_spawn(sock, args)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the API from several forked workers that share loaded models.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="let every worker load its own models, as separate processes would")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args)
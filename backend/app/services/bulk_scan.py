@@ -0,0 +1,268 @@
+"""
+Offline OCR of whole chapters: folders of page images and CBZ/ZIP archives
+become one JSON line per page with its text, the vocabulary found in it and
+its kanji.
+
+    python -m app.services.bulk_scan INPUT [INPUT ...] --output pages.jsonl [--workers N]
+
+Pages are spread over a process pool; each worker loads the OCR model and
+the dictionary once and then takes page after page. Lines are appended to
+the output as pages finish, in completion order, so the output file is
+also the checkpoint: running the same command again skips every page
+already in it and scans the failed ones again, replacing their lines (pass
+--restart to start over). Progress and the final
+pages/sec are logged, to size batch jobs by.
+
+Pages are OCR'd with region splitting on, as a page holds many bubbles;
+see app/services/preprocess.py.
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+import multiprocessing
+import argparse
+import logging
+import zipfile
+import json
+import time
+import os
+import re
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+ARCHIVE_SUFFIXES = {".cbz", ".zip"}
+# word results looked up per distinct token; the page line keeps only the best one
+_WORD_RESULTS = 1
+# pages queued per worker ahead of the one it is on, so a stop loses little work
+_PAGES_IN_FLIGHT_PER_WORKER = 2
+_PROGRESS_INTERVAL_S = 10.0
+
+# (source path, archive member or None for a plain image file)
+PageRef = Tuple[str, Optional[str]]
+
+
+def _natural_key(text: str) -> List[Any]:
+    # page2 before page10
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", text)]
+
+
+def page_id(page: PageRef) -> str:
+    source, member = page
+    return f"{source}!{member}" if member is not None else source
+
+
+def find_pages(inputs: List[Path]) -> List[PageRef]:
+    """Every page image in the given folders, archives and image files, each input in natural page order."""
+    pages: List[PageRef] = []
+    for path in inputs:
+        if path.is_dir():
+            files = sorted(
+                (p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES | ARCHIVE_SUFFIXES),
+                key=lambda p: _natural_key(str(p.relative_to(path))),
+            )
+            pages.extend(find_pages(files))
+        elif path.suffix.lower() in ARCHIVE_SUFFIXES:
+            with zipfile.ZipFile(path) as archive:
+                members = [
+                    info.filename for info in archive.infolist()
+                    if not info.is_dir() and Path(info.filename).suffix.lower() in IMAGE_SUFFIXES
+                    and not Path(info.filename).name.startswith(".")
+                ]
+            pages.extend((str(path), member) for member in sorted(members, key=_natural_key))
+        elif path.suffix.lower() in IMAGE_SUFFIXES:
+            pages.append((str(path), None))
+        else:
+            logger.warning(f"Skipping {path}: not a folder, CBZ/ZIP archive or page image")
+    return pages
+
+
+def _read_page(page: PageRef) -> bytes:
+    source, member = page
+    if member is None:
+        return Path(source).read_bytes()
+    with zipfile.ZipFile(source) as archive:
+        return archive.read(member)
+
+
+def read_checkpoint(output: Path) -> Set[str]:
+    """
+    Ids of the pages already written to output without an error. Lines of
+    failed pages, and a line cut short by an interrupted run, are dropped
+    from the file, so a page has one line in it however many runs it took.
+    """
+    done: Set[str] = set()
+    if not output.exists():
+        return done
+    kept: List[bytes] = []
+    dropped = 0
+    with output.open("rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if record is None or not line.endswith(b"\n") or "error" in record:
+                dropped += 1
+                continue
+            kept.append(line)
+            done.add(record["page"])
+    if dropped:
+        logger.info(f"Dropping {dropped} failed or incomplete page line(s) from {output}; those pages are scanned again")
+        temp_path = output.with_name(output.name + ".tmp")
+        with temp_path.open("wb") as f:
+            f.writelines(kept)
+        os.replace(temp_path, output)
+    return done
+
+
+def _init_worker(torch_threads: int, log_level: int) -> None:
+    logging.basicConfig(level=log_level)
+    # the search module sets its own level on import; per-lookup logging would drown the progress lines
+    import app.services.search
+    logging.getLogger("app.services.search").setLevel(logging.WARNING)
+
+    config.OCR_SPLIT_REGIONS = 1
+    config.OCR_TORCH_THREADS = torch_threads
+    if config.OCR_BACKEND.startswith("torch"):
+        import torch
+        torch.set_num_threads(torch_threads)
+
+    from app.services.scan import get_ocr_engine
+    get_ocr_engine()
+    # builds the tagger and the search indexes, so pages/sec is not skewed by the first pages
+    _vocabulary("日本語")
+
+
+def _vocabulary(text: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    from app.services.kanji_index import is_kanji
+    from app.services.pipeline import tokenize_text
+    from app.services.search import search_general
+
+    vocabulary: Dict[str, Dict[str, Any]] = {}
+    for token in tokenize_text(text):
+        if not token["lookup"]:
+            continue
+        word = vocabulary.get(token["base"])
+        if word is not None:
+            word["count"] += 1
+            continue
+        results = search_general(token["base"], _WORD_RESULTS)["results"]
+        entry = next((result["data"] for result in results if result["type"] == "word"), None)
+        vocabulary[token["base"]] = {
+            "base": token["base"],
+            "reading": token["reading"],
+            "pos": token["pos"],
+            "count": 1,
+            "idseq": entry["idseq"] if entry else None,
+            "headword": (entry["kanji_forms"] or entry["kana_forms"] or [None])[0] if entry else None,
+            "meaning": entry["senses"][0]["glosses"][0] if entry and entry["senses"] and entry["senses"][0]["glosses"] else None,
+        }
+    kanji = list(dict.fromkeys(char for char in text if is_kanji(char)))
+    return list(vocabulary.values()), kanji
+
+
+def scan_page(page: PageRef) -> Dict[str, Any]:
+    """OCRs one page and looks up its words; errors come back in the record instead of being raised."""
+    from app.services.scan import decode_image_bytes, run_ocr_batch
+
+    started_at = time.perf_counter()
+    record: Dict[str, Any] = {"page": page_id(page), "source": page[0], "member": page[1]}
+    try:
+        image = decode_image_bytes(_read_page(page))
+        record["width"], record["height"] = image.size
+        text = run_ocr_batch([image.convert("RGB")])[0]
+        vocabulary, kanji = _vocabulary(text)
+        record.update(text=text, vocabulary=vocabulary, kanji=kanji)
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - started_at, 3)
+    record["worker"] = os.getpid()
+    return record
+
+
+def bulk_scan(inputs: List[Path], output: Path, workers: int = 1, restart: bool = False) -> Dict[str, Any]:
+    """Scans every page under inputs not already in output, appending to it. Returns run statistics."""
+    start = time.perf_counter()
+    pages = find_pages(inputs)
+    if restart and output.exists():
+        output.unlink()
+    done = read_checkpoint(output)
+    todo = [page for page in pages if page_id(page) not in done]
+    logger.info(f"{len(pages)} pages found, {len(pages) - len(todo)} already in {output}, {len(todo)} to scan with {workers} worker(s)")
+    stats = {"pages": len(pages), "skipped": len(pages) - len(todo), "scanned": 0, "failed": 0}
+    if not todo:
+        return {**stats, "seconds": 0.0, "pages_per_second": 0.0}
+
+    workers = max(1, min(workers, len(todo)))
+    # split the cores between the workers rather than have every model claim all of them
+    torch_threads = config.OCR_TORCH_THREADS if config.OCR_TORCH_THREADS > 0 else max(1, (os.cpu_count() or 1) // workers)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    # spawned, not forked: torch's thread pools do not survive a fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(torch_threads, logging.getLogger().level)) as pool, \
+            output.open("a", encoding="utf-8") as out:
+        remaining = iter(todo)
+        pending: Set[Future] = set()
+        scan_started_at = None
+        last_progress = time.perf_counter()
+
+        def _fill() -> None:
+            for page in remaining:
+                pending.add(pool.submit(scan_page, page))
+                if len(pending) >= workers * _PAGES_IN_FLIGHT_PER_WORKER:
+                    break
+
+        _fill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pending.discard(future)
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if "error" in record:
+                    stats["failed"] += 1
+                    logger.warning(f"Failed on {record['page']}: {record['error']}")
+                else:
+                    stats["scanned"] += 1
+                # model loading is not throughput; time from the first finished page on
+                if scan_started_at is None:
+                    scan_started_at = time.perf_counter() - record["seconds"]
+            out.flush()
+            _fill()
+
+            now = time.perf_counter()
+            if now - last_progress >= _PROGRESS_INTERVAL_S:
+                last_progress = now
+                finished_pages = stats["scanned"] + stats["failed"]
+                logger.info(
+                    f"  {finished_pages}/{len(todo)} pages, {finished_pages / max(now - scan_started_at, 1e-9):.2f} pages/sec"
+                )
+
+    elapsed = time.perf_counter() - (scan_started_at or start)
+    finished_pages = stats["scanned"] + stats["failed"]
+    stats.update(
+        seconds=round(time.perf_counter() - start, 1),
+        pages_per_second=round(finished_pages / max(elapsed, 1e-9), 3),
+    )
+    logger.info(
+        f"Scanned {stats['scanned']} pages ({stats['failed']} failed) in {stats['seconds']}s, "
+        f"{stats['pages_per_second']} pages/sec with {workers} worker(s) after model loading"
+    )
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="OCR folders or CBZ archives of manga pages into JSON lines of text and vocabulary.")
+    parser.add_argument("inputs", nargs="+", type=Path, help="folders, .cbz/.zip archives or page images")
+    parser.add_argument("--output", type=Path, required=True, help="JSONL file to append pages to; also the resume checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes, each with its own loaded model")
+    parser.add_argument("--restart", action="store_true", help="discard the output and scan every page again")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(bulk_scan(args.inputs, args.output, workers=args.workers, restart=args.restart)))
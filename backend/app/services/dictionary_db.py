@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+from jamdict import Jamdict
+from importlib import metadata
+from pathlib import Path
+from puchikarui import ExecutionContext
+from typing import Iterator, Optional
+import threading
+import logging
+import sqlite3
+import queue
+import os
+
+from app import config
+from app.services.metrics import count_query
+
+logger = logging.getLogger(__name__)
+
+_db_path: Optional[Path] = None
+_db_path_lock = threading.Lock()
+
+
+def get_db_path() -> Path:
+    """Returns the path of the jamdict SQLite database (JMdict + KANJIDIC2)."""
+    global _db_path
+    if _db_path is None:
+        with _db_path_lock:
+            if _db_path is None:
+                db_file = Jamdict().db_file
+                if not db_file:
+                    raise RuntimeError("Jamdict database not found. Is jamdict_data installed?")
+                _db_path = Path(db_file)
+    return _db_path
+
+
+def _count_statement(_statement: str) -> None:
+    count_query()
+
+
+class _PooledExecutionContext(ExecutionContext):
+    """A puchikarui context over a pooled connection; the pool, not the context, closes it."""
+
+    def __init__(self, conn: sqlite3.Connection, schema):
+        self.conn = conn
+        self.cur = conn.cursor()
+        self.schema = schema
+        self.auto_commit = False
+
+    def close(self):
+        pass
+
+
+class DictionaryConnectionPool:
+    """
+    Bounded pool of tuned read-only connections to the jamdict database.
+    Each checked-out connection belongs to one thread until it is returned.
+
+    Connections open the file with mode=ro&immutable=1, since jamdict_data
+    never changes under a running process, so SQLite skips file locking and
+    change detection. They also set query_only, a larger page cache and
+    mmap_size so reads come straight from the shared OS page cache, and keep
+    a larger prepared-statement cache so repeated lookups skip parsing.
+    """
+
+    def __init__(self, size: int, mmap_bytes: int, cache_kib: int, cached_statements: int):
+        self.size = max(1, size)
+        self.mmap_bytes = mmap_bytes
+        self.cache_kib = cache_kib
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self.checkouts = 0
+        self.waits = 0
+        # an SQLite connection must not be used on both sides of a fork
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"{get_db_path().as_uri()}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        # counts every statement against the request that runs it
+        conn.set_trace_callback(_count_statement)
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_bytes)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Checks out a connection with sqlite3.Row rows, blocking while all of them are in use."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+                with self._lock:
+                    self._opened += 1
+            conn.row_factory = sqlite3.Row
+            with self._lock:
+                self.checkouts += 1
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def jamdict_context(self, database) -> Iterator[ExecutionContext]:
+        """
+        A pooled connection as a puchikarui context for jamdict calls that
+        take ctx=, e.g. jam.jmdict.get_entry(idseq, ctx=ctx) or
+        jam.lookup(query, ctx=ctx). database is the schema to expose,
+        normally jam.jmdict, which covers every jamdict table.
+        """
+        with self.connection() as conn:
+            yield _PooledExecutionContext(conn, database)
+
+    def _forget_connections(self) -> None:
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+            }
+
+
+dictionary_pool = DictionaryConnectionPool(
+    size=config.DICT_DB_POOL_SIZE,
+    mmap_bytes=config.DICT_DB_MMAP_BYTES,
+    cache_kib=config.DICT_DB_CACHE_KIB,
+    cached_statements=config.DICT_DB_CACHED_STATEMENTS,
+)
+
+
+def jamdict_data_version() -> str:
+    """The installed jamdict_data release, recorded in artifacts derived from its database."""
+    try:
+        return metadata.version("jamdict_data")
+    except metadata.PackageNotFoundError:
+        return "unknown"
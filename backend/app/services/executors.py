@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+import contextvars
+import functools
+import threading
+import asyncio
+import logging
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+_search_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _init_ocr_worker() -> None:
+    # torch's intra-op pool is process-wide, so cap it before the first
+    # inference rather than letting every worker spawn one thread per core
+    if config.OCR_TORCH_THREADS > 0 and config.OCR_BACKEND.startswith("torch"):
+        import torch
+        torch.set_num_threads(config.OCR_TORCH_THREADS)
+
+
+def get_ocr_executor() -> ThreadPoolExecutor:
+    """Returns the bounded pool that runs OCR inference."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        with _executor_lock:
+            if _ocr_executor is None:
+                _ocr_executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.OCR_WORKERS),
+                    thread_name_prefix="ocr",
+                    initializer=_init_ocr_worker,
+                )
+                logger.info(f"OCR pool started with {config.OCR_WORKERS} workers")
+    return _ocr_executor
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """Returns the pool that runs dictionary lookups, separate from OCR."""
+    global _search_executor
+    if _search_executor is None:
+        with _executor_lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.SEARCH_WORKERS),
+                    thread_name_prefix="search",
+                )
+                logger.info(f"Search pool started with {config.SEARCH_WORKERS} workers")
+    return _search_executor
+
+
+def _in_current_context(fn: Callable[..., T], *args: Any, **kwargs: Any) -> Callable[[], T]:
+    # run_in_executor does not carry contextvars over, and the request's stage timings live in one
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn, *args, **kwargs)
+
+
+async def run_in_ocr_pool(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ocr_executor(), _in_current_context(fn, *args, **kwargs))
+
+
+async def run_in_search_pool(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_search_executor(), _in_current_context(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    global _ocr_executor, _search_executor
+    with _executor_lock:
+        for executor in (_ocr_executor, _search_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _ocr_executor = None
+        _search_executor = None
@@ -0,0 +1,291 @@
+"""
+Full-text index over JMdict's English glosses for English->Japanese search.
+
+Glosses are indexed with SQLite FTS5 and the porter stemmer, so "eats" finds
+"to eat", and a trailing '*' on a term makes it a prefix query ("wat*"). The
+index lives in its own SQLite file next to the kanji store and is built on
+startup when it is missing; rebuild it by hand with:
+
+    python -m app.services.gloss_index build [--output PATH]
+
+Like the kanji store, it records the jamdict_data release and
+INDEX_FORMAT_VERSION it was built from and is ignored when they differ.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import threading
+import tempfile
+import argparse
+import logging
+import sqlite3
+import time
+import os
+import re
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds are not coordinated there
+    fcntl = None
+
+from app import config
+from app.services.dictionary_db import dictionary_pool, jamdict_data_version
+from app.services.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the table layout or tokenizer changes
+INDEX_FORMAT_VERSION = 1
+# gloss rows considered per query, best bm25 first; broad terms like "to" match far more
+MAX_GLOSS_ROWS = 2000
+
+_TERM = re.compile(r"[^\W_]+\*?")
+# parenthesised qualifiers and the infinitive/article prefixes JMdict glosses carry
+_QUALIFIER = re.compile(r"\([^()]*\)")
+_LEADING_PARTICLE = re.compile(r"^(to|a|an|the) ")
+
+
+@dataclass(frozen=True)
+class GlossMatch:
+    """
+    How an entry's best gloss matched: exact means the gloss is just the
+    query's words (give or take stemming, qualifiers in brackets and a
+    leading "to"), sense_index is the position of the gloss's sense in the
+    entry and score is the FTS5 bm25 rank, lower is better.
+    """
+    exact: bool
+    sense_index: int
+    score: float
+
+
+def _gloss_terms(text: str) -> List[str]:
+    text = text.lower()
+    # innermost brackets first, qualifiers can nest: "dog (Canis (lupus) familiaris)"
+    while True:
+        stripped = _QUALIFIER.sub(" ", text)
+        if stripped == text:
+            break
+        text = stripped
+    return _TERM.findall(_LEADING_PARTICLE.sub("", " ".join(text.split())))
+
+
+def _same_word(query_term: str, gloss_term: str) -> bool:
+    # a rough stand-in for the porter stemmer: "eats", "eat" and "eating" share their stem
+    query_term = query_term.rstrip("*")
+    length = max(3, min(len(query_term), len(gloss_term)) - 2)
+    return query_term[:length] == gloss_term[:length]
+
+
+def _is_exact(query_terms: List[str], gloss: str) -> bool:
+    gloss_terms = _gloss_terms(gloss)
+    return len(gloss_terms) == len(query_terms) and all(
+        any(_same_word(query_term, gloss_term) for gloss_term in gloss_terms) for query_term in query_terms
+    )
+
+
+def build_match_expression(query: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 expression: every word must match (after
+    stemming), and a word ending in '*' matches as a prefix. Returns None
+    when the query has no searchable words.
+    """
+    terms = []
+    for term in _TERM.findall(query.lower()):
+        if term.endswith("*"):
+            terms.append(f'"{term[:-1]}"*')
+        else:
+            terms.append(f'"{term}"')
+    return " ".join(terms) if terms else None
+
+
+class GlossIndex:
+    """Read-only access to a built gloss index; connections are opened per thread."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        # a pre-fork parent's connection must not be reused by its workers
+        os.register_at_fork(after_in_child=self._forget_connections)
+        conn = self._connection()
+        self.meta: Dict[str, str] = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _forget_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def is_compatible(self) -> bool:
+        return (
+            self.meta.get("format_version") == str(INDEX_FORMAT_VERSION)
+            and self.meta.get("jamdict_data_version") == jamdict_data_version()
+        )
+
+    @stage("gloss_index_search")
+    def search(self, query: str) -> Dict[int, GlossMatch]:
+        """Entries with an English gloss matching query, keyed by idseq, with how each matched."""
+        expression = build_match_expression(query)
+        if expression is None:
+            return {}
+        query_terms = _gloss_terms(query)
+        rows = self._connection().execute(
+            "SELECT idseq, text, sense_index, bm25(gloss) FROM gloss WHERE gloss MATCH ? ORDER BY rank LIMIT ?",
+            (expression, MAX_GLOSS_ROWS),
+        )
+        matches: Dict[int, GlossMatch] = {}
+        for idseq, text, sense_index, score in rows:
+            match = GlossMatch(exact=_is_exact(query_terms, text), sense_index=sense_index, score=score)
+            best = matches.get(idseq)
+            if best is None or (not match.exact, match.sense_index, match.score) < (not best.exact, best.sense_index, best.score):
+                matches[idseq] = match
+        return matches
+
+
+def build_index(output: Path) -> int:
+    """Indexes every English gloss and writes the index atomically. Returns the number of glosses."""
+    start = time.perf_counter()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    # a name of its own, so another process building at the same time cannot clobber it
+    fd, temp_name = tempfile.mkstemp(dir=output.parent, prefix=output.name + ".", suffix=".tmp")
+    os.close(fd)
+    temp_path = Path(temp_name)
+    # mkstemp creates it owner-only; keep the index readable like any other data file
+    os.chmod(temp_path, 0o644)
+    try:
+        count = _write_index(temp_path)
+        os.replace(temp_path, output)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    logger.info(f"Indexed {count} English glosses into {output} in {time.perf_counter() - start:.1f}s")
+    return count
+
+
+def _write_index(temp_path: Path) -> int:
+    conn = sqlite3.connect(temp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute(
+        "CREATE VIRTUAL TABLE gloss USING fts5(text, idseq UNINDEXED, sense_index UNINDEXED, tokenize='porter unicode61')"
+    )
+
+    def _rows():
+        current_idseq, sense_index, current_sid = None, -1, None
+        with dictionary_pool.connection() as source:
+            source.row_factory = None
+            rows = source.execute(
+                "SELECT s.idseq, s.ID, g.text FROM Sense s JOIN SenseGloss g ON g.sid = s.ID"
+                " WHERE g.lang = 'eng' ORDER BY s.idseq, s.ID, g.rowid"
+            )
+            for idseq, sid, text in rows:
+                if idseq != current_idseq:
+                    current_idseq, sense_index, current_sid = idseq, -1, None
+                if sid != current_sid:
+                    current_sid = sid
+                    sense_index += 1
+                if text:
+                    yield text, idseq, sense_index
+
+    count = conn.executemany("INSERT INTO gloss (text, idseq, sense_index) VALUES (?, ?, ?)", _rows()).rowcount
+    conn.execute("INSERT INTO gloss (gloss) VALUES ('optimize')")
+    conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+        ("format_version", str(INDEX_FORMAT_VERSION)),
+        ("jamdict_data_version", jamdict_data_version()),
+        ("built_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())),
+        ("count", str(count)),
+    ])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return count
+
+
+@contextmanager
+def _build_lock(path: Path) -> Iterator[None]:
+    """Holds an exclusive lock on <path>.lock, so one process builds while the others wait."""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_index: Optional[GlossIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def _open_index(path: Path) -> Optional[GlossIndex]:
+    if not path.exists():
+        return None
+    try:
+        index = GlossIndex(path)
+    except sqlite3.Error as e:
+        logger.error(f"Could not open gloss index {path}: {e}")
+        return None
+    if not index.is_compatible():
+        logger.warning(
+            f"Ignoring gloss index {path}: built for format {index.meta.get('format_version')} / "
+            f"jamdict_data {index.meta.get('jamdict_data_version')}, running format {INDEX_FORMAT_VERSION} / "
+            f"jamdict_data {jamdict_data_version()}."
+        )
+        return None
+    return index
+
+
+def get_gloss_index() -> Optional[GlossIndex]:
+    """
+    Returns the gloss index at GLOSS_INDEX_PATH, or None until it has been
+    built for the running jamdict_data release. English search falls back
+    to jamdict's LIKE matching meanwhile.
+    """
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                _index = _open_index(Path(config.GLOSS_INDEX_PATH))
+                _index_loaded = True
+    return _index
+
+
+def ensure_gloss_index() -> Optional[GlossIndex]:
+    """Builds the gloss index if there is no usable one yet, then returns it."""
+    global _index, _index_loaded
+    index = get_gloss_index()
+    if index is not None:
+        return index
+    with _index_lock:
+        if _index is None:
+            path = Path(config.GLOSS_INDEX_PATH)
+            with _build_lock(path):
+                # another process may have built it while this one waited for the lock
+                _index = _open_index(path)
+                if _index is None:
+                    logger.info(f"Building gloss index at {path}")
+                    build_index(path)
+                    _index = _open_index(path)
+            _index_loaded = True
+    return _index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the English gloss full-text index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="index every English gloss")
+    build_parser.add_argument("--output", type=Path, default=Path(config.GLOSS_INDEX_PATH))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_index(args.output)
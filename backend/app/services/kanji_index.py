@@ -0,0 +1,227 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from array import array
+import threading
+import re
+import logging
+import time
+
+from app.services.dictionary_db import dictionary_pool
+
+logger = logging.getLogger(__name__)
+
+# kanji without a frequency rank or grade sort after every kanji that has one
+_UNRANKED = 1_000_000
+
+# JMdict priority tags: the *1 tags mark the most common words, nfXX ranks
+# newspaper frequency in bands of 500 words
+_TOP_PRIORITY_TAGS = {"news1", "ichi1", "spec1", "gai1"}
+_SECOND_PRIORITY_TAGS = {"news2", "ichi2", "spec2", "gai2"}
+_NF_TAG = re.compile(r"^nf(\d+)$")
+_NO_PRIORITY_SCORE = 1000
+
+
+def is_kanji(char: str) -> bool:
+    return (
+        '\u4e00' <= char <= '\u9fff'
+        or '\u3400' <= char <= '\u4dbf'
+        or '\uf900' <= char <= '\ufaff'
+        or '\U00020000' <= char <= '\U0002ffff'
+    )
+
+
+def priority_score(tags) -> int:
+    """Lower is more common. Words without any priority tag score _NO_PRIORITY_SCORE."""
+    tags = set(tags)
+    if not tags:
+        return _NO_PRIORITY_SCORE
+    tier = 2
+    if tags & _TOP_PRIORITY_TAGS:
+        tier = 0
+    elif tags & _SECOND_PRIORITY_TAGS:
+        tier = 1
+    nf_rank = min((int(m.group(1)) for m in map(_NF_TAG.match, tags) if m), default=99)
+    return tier * 100 + nf_rank
+
+
+@dataclass(frozen=True)
+class KanjiReadings:
+    literal: str
+    on_yomi: Tuple[str, ...]
+    kun_yomi: Tuple[str, ...]
+    meanings: Tuple[str, ...]
+    stroke_count: int
+    grade: Optional[int]
+    freq: Optional[int]
+
+    @property
+    def rank(self) -> Tuple[int, int, int, str]:
+        return (
+            self.freq if self.freq is not None else _UNRANKED,
+            self.grade if self.grade is not None else _UNRANKED,
+            self.stroke_count or _UNRANKED,
+            self.literal,
+        )
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ReadingIndex:
+    """
+    In-memory KANJIDIC2 index from each on/kun reading to the kanji that have
+    it, ordered by frequency rank, then school grade, then stroke count.
+    """
+
+    def __init__(self, kanji: Dict[str, KanjiReadings]):
+        self._kanji = kanji
+        by_reading: Dict[str, List[KanjiReadings]] = {}
+        for info in kanji.values():
+            for reading in set(info.on_yomi) | set(info.kun_yomi):
+                by_reading.setdefault(reading, []).append(info)
+        self._by_reading: Dict[str, Tuple[str, ...]] = {
+            reading: tuple(info.literal for info in sorted(infos, key=lambda i: i.rank))
+            for reading, infos in by_reading.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._kanji)
+
+    def get(self, literal: str) -> Optional[KanjiReadings]:
+        return self._kanji.get(literal)
+
+    def kanji_for_reading(self, reading: str) -> Tuple[str, ...]:
+        return self._by_reading.get(reading, ())
+
+
+def build_reading_index() -> ReadingIndex:
+    """Builds the reading index with three full-table queries over KANJIDIC2."""
+    start = time.perf_counter()
+    on_yomi: Dict[int, List[str]] = {}
+    kun_yomi: Dict[int, List[str]] = {}
+    meanings: Dict[int, List[str]] = {}
+
+    with dictionary_pool.connection() as conn:
+        characters = conn.execute("SELECT ID, literal, stroke_count, grade, freq FROM character").fetchall()
+
+        rows = conn.execute(
+            "SELECT g.cid, r.r_type, r.value FROM reading r JOIN rm_group g ON g.ID = r.gid"
+            " WHERE r.r_type IN ('ja_on', 'ja_kun') ORDER BY r.rowid"
+        )
+        for row in rows:
+            target = on_yomi if row["r_type"] == "ja_on" else kun_yomi
+            target.setdefault(row["cid"], []).append(row["value"])
+
+        rows = conn.execute("SELECT g.cid, m.value FROM meaning m JOIN rm_group g ON g.ID = m.gid ORDER BY m.rowid")
+        for row in rows:
+            meanings.setdefault(row["cid"], []).append(row["value"])
+
+    kanji: Dict[str, KanjiReadings] = {}
+    for row in characters:
+        cid = row["ID"]
+        kanji[row["literal"]] = KanjiReadings(
+            literal=row["literal"],
+            on_yomi=tuple(sorted(set(on_yomi.get(cid, ())))),
+            kun_yomi=tuple(sorted(set(kun_yomi.get(cid, ())))),
+            meanings=tuple(meanings.get(cid, ())),
+            stroke_count=row["stroke_count"] or 0,
+            grade=_to_int(row["grade"]),
+            freq=_to_int(row["freq"]),
+        )
+
+    index = ReadingIndex(kanji)
+    logger.info(f"Built kanji reading index for {len(index)} kanji in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+_reading_index: Optional[ReadingIndex] = None
+_reading_index_lock = threading.Lock()
+
+
+def get_reading_index() -> ReadingIndex:
+    """Returns the process-wide reading index, building it on first use."""
+    global _reading_index
+    if _reading_index is None:
+        with _reading_index_lock:
+            if _reading_index is None:
+                _reading_index = build_reading_index()
+    return _reading_index
+
+
+class WordIndex:
+    """
+    In-memory JMdict index from each kanji character to the ids (idseq) of
+    entries with a kanji form containing it, common/priority-tagged words
+    first, then shorter words.
+    """
+
+    def __init__(self, by_kanji: Dict[str, array]):
+        self._by_kanji = by_kanji
+
+    def __len__(self) -> int:
+        return len(self._by_kanji)
+
+    def entries_for_kanji(self, kanji: str) -> array:
+        return self._by_kanji.get(kanji, array("q"))
+
+
+def build_word_index() -> WordIndex:
+    """Builds the word index with one pass over the JMdict kanji forms and their priority tags."""
+    start = time.perf_counter()
+    grouped: Dict[str, List[Tuple[int, int, int]]] = {}
+
+    def _flush(idseq: int, score: int, lengths: Dict[str, int]) -> None:
+        for char, length in lengths.items():
+            grouped.setdefault(char, []).append((score, length, idseq))
+
+    with dictionary_pool.connection() as conn:
+        conn.row_factory = None
+        tags_by_form: Dict[int, List[str]] = {}
+        for kid, tag in conn.execute("SELECT kid, text FROM KJP"):
+            tags_by_form.setdefault(kid, []).append(tag)
+
+        current_idseq = None
+        current_score = _NO_PRIORITY_SCORE
+        # kanji -> length of the shortest form of the current entry containing it
+        current_lengths: Dict[str, int] = {}
+        for form_id, idseq, text in conn.execute("SELECT ID, idseq, text FROM Kanji ORDER BY idseq"):
+            if idseq != current_idseq:
+                if current_idseq is not None:
+                    _flush(current_idseq, current_score, current_lengths)
+                current_idseq, current_score, current_lengths = idseq, _NO_PRIORITY_SCORE, {}
+
+            text = text or ""
+            tags = tags_by_form.get(form_id)
+            if tags:
+                current_score = min(current_score, priority_score(tags))
+            for char in text:
+                if is_kanji(char) and len(text) < current_lengths.get(char, 1 << 30):
+                    current_lengths[char] = len(text)
+        if current_idseq is not None:
+            _flush(current_idseq, current_score, current_lengths)
+
+    by_kanji = {
+        char: array("q", [idseq for _, _, idseq in sorted(candidates)])
+        for char, candidates in grouped.items()
+    }
+    index = WordIndex(by_kanji)
+    logger.info(f"Built kanji word index for {len(index)} kanji in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+_word_index: Optional[WordIndex] = None
+_word_index_lock = threading.Lock()
+
+
+def get_word_index() -> WordIndex:
+    """Returns the process-wide word index, building it on first use."""
+    global _word_index
+    if _word_index is None:
+        with _word_index_lock:
+            if _word_index is None:
+                _word_index = build_word_index()
+    return _word_index
@@ -0,0 +1,199 @@
+"""
+Prebuilt, read-only store of kanji detail responses.
+
+Every KANJIDIC2 character's search_kanji result is computed offline and saved
+as pre-serialized JSON in an indexed SQLite blob table, so the kanji endpoint
+can answer with a single primary-key read and no jamdict queries.
+
+Build it with:
+
+    python -m app.services.kanji_store build [--output PATH] [--workers N]
+
+The artifact records the jamdict_data release and STORE_FORMAT_VERSION it was
+built from; a store that does not match the running install is ignored.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+import argparse
+import logging
+import sqlite3
+import json
+import time
+import os
+
+from app import config
+from app.services.dictionary_db import dictionary_pool, jamdict_data_version
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the shape or content rules of the kanji detail response change
+STORE_FORMAT_VERSION = 2
+
+
+class KanjiDetailStore:
+    """Read-only access to a built kanji store; connections are opened per thread."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        # a pre-fork parent's connection must not be reused by its workers
+        os.register_at_fork(after_in_child=self._forget_connections)
+        conn = self._connection()
+        self.meta: Dict[str, str] = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _forget_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # immutable: the artifact never changes once built, so SQLite can skip locking
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def is_compatible(self) -> bool:
+        return (
+            self.meta.get("format_version") == str(STORE_FORMAT_VERSION)
+            and self.meta.get("jamdict_data_version") == jamdict_data_version()
+        )
+
+    def get_json(self, literal: str) -> Optional[bytes]:
+        """Returns the serialized KanjiInfoResponse for a kanji, or None if it is not in the store."""
+        row = self._connection().execute("SELECT payload FROM kanji_detail WHERE literal = ?", (literal,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, literal: str) -> Optional[dict]:
+        payload = self.get_json(literal)
+        return json.loads(payload) if payload is not None else None
+
+
+_store: Optional[KanjiDetailStore] = None
+_store_loaded = False
+_store_lock = threading.Lock()
+
+
+def get_kanji_store() -> Optional[KanjiDetailStore]:
+    """
+    Returns the kanji store at KANJI_STORE_PATH, or None when it has not been
+    built or was built against a different jamdict_data release or format.
+    """
+    global _store, _store_loaded
+    if not _store_loaded:
+        with _store_lock:
+            if not _store_loaded:
+                path = Path(config.KANJI_STORE_PATH)
+                if path.exists():
+                    try:
+                        store = KanjiDetailStore(path)
+                        if store.is_compatible():
+                            _store = store
+                            logger.info(f"Serving kanji details from {path} ({store.meta.get('count')} kanji)")
+                        else:
+                            logger.warning(
+                                f"Ignoring kanji store {path}: built for format {store.meta.get('format_version')} / "
+                                f"jamdict_data {store.meta.get('jamdict_data_version')}, running format {STORE_FORMAT_VERSION} / "
+                                f"jamdict_data {jamdict_data_version()}. Rebuild it with 'python -m app.services.kanji_store build'."
+                            )
+                    except sqlite3.Error as e:
+                        logger.error(f"Could not open kanji store {path}: {e}")
+                else:
+                    logger.info(f"No kanji store at {path}; kanji details are computed live.")
+                _store_loaded = True
+    return _store
+
+
+def _all_kanji_literals() -> List[str]:
+    with dictionary_pool.connection() as conn:
+        return [row["literal"] for row in conn.execute("SELECT literal FROM character ORDER BY ID")]
+
+
+def _compute_payloads(literals: List[str]) -> List[Tuple[str, Optional[bytes]]]:
+    from app.services.search import compute_kanji_info
+    from app.routers.search import KanjiInfoResponse
+
+    results = []
+    for literal in literals:
+        info = compute_kanji_info(literal)
+        # serialize through the response model so stored bytes match what the endpoint returns live
+        payload = KanjiInfoResponse(**info).model_dump_json().encode("utf-8") if info else None
+        results.append((literal, payload))
+    return results
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def build_store(output: Path, workers: int = 1, chunk_size: int = 200) -> int:
+    """Computes every kanji's detail response and writes the store atomically. Returns the kanji count."""
+    start = time.perf_counter()
+    literals = _all_kanji_literals()
+    logger.info(f"Building kanji store for {len(literals)} kanji with {workers} worker(s)")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output.with_suffix(output.suffix + ".tmp")
+    if temp_path.exists():
+        temp_path.unlink()
+
+    conn = sqlite3.connect(temp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("CREATE TABLE kanji_detail (literal TEXT PRIMARY KEY, payload BLOB NOT NULL) WITHOUT ROWID")
+
+    count = 0
+    done = 0
+    chunks = list(_chunks(literals, chunk_size))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results_iter = pool.map(_compute_payloads, chunks)
+            for results in results_iter:
+                count += _insert_payloads(conn, results)
+                done += len(results)
+                logger.info(f"  {done}/{len(literals)} kanji processed")
+    else:
+        for chunk in chunks:
+            results = _compute_payloads(chunk)
+            count += _insert_payloads(conn, results)
+            done += len(results)
+            logger.info(f"  {done}/{len(literals)} kanji processed")
+
+    conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+        ("format_version", str(STORE_FORMAT_VERSION)),
+        ("jamdict_data_version", jamdict_data_version()),
+        ("built_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())),
+        ("count", str(count)),
+    ])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(temp_path, output)
+
+    logger.info(f"Wrote {count} kanji to {output} in {time.perf_counter() - start:.1f}s")
+    return count
+
+
+def _insert_payloads(conn: sqlite3.Connection, results: List[Tuple[str, Optional[bytes]]]) -> int:
+    rows = [(literal, payload) for literal, payload in results if payload is not None]
+    conn.executemany("INSERT OR REPLACE INTO kanji_detail (literal, payload) VALUES (?, ?)", rows)
+    conn.commit()
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the prebuilt kanji detail store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="compute every kanji and write the store")
+    build_parser.add_argument("--output", type=Path, default=Path(config.KANJI_STORE_PATH))
+    build_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # import before quieting it: the module sets its own level on import
+    import app.services.search
+    logging.getLogger("app.services.search").setLevel(logging.WARNING)
+    build_store(args.output, workers=args.workers)
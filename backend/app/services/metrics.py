@@ -0,0 +1,220 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import threading
+import time
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# latency buckets shared by the per-stage histograms, in seconds
+STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram. Buckets are upper bounds; observations above the
+    last bucket are only counted in the implicit +Inf bucket.
+    """
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float], labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets: List[float] = sorted(buckets)
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """Returns cumulative bucket counts plus the total count and sum."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total_count = self._count
+
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[f"{bound:g}"] = running
+        cumulative["+Inf"] = running + counts[-1]
+
+        return {
+            "buckets": cumulative,
+            "count": total_count,
+            "sum": total_sum,
+        }
+
+    def render(self) -> List[str]:
+        snapshot = self.snapshot()
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labels, ('le', bound))} {count}"
+            for bound, count in snapshot["buckets"].items()
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {snapshot['sum']:g}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {snapshot['count']}")
+        return lines
+
+
+class Counter:
+    """A monotonically increasing count."""
+
+    def __init__(self, name: str, description: str, labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels)} {self._value:g}"]
+
+
+class MetricsRegistry:
+    """Get-or-create store of metrics, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, factory, name: str, labels: Dict[str, str], *args):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = factory(name, *args, labels=key[1])
+                    self._metrics[key] = metric
+        return metric
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float], **labels: str) -> Histogram:
+        return self._get_or_create(Histogram, name, labels, description, buckets)
+
+    def counter(self, name: str, description: str, **labels: str) -> Counter:
+        return self._get_or_create(Counter, name, labels, description)
+
+    def render_prometheus(self) -> str:
+        families: Dict[str, List[object]] = {}
+        with self._lock:
+            for (name, _), metric in sorted(self._metrics.items()):
+                families.setdefault(name, []).append(metric)
+
+        lines: List[str] = []
+        for name, metrics in families.items():
+            kind = "histogram" if isinstance(metrics[0], Histogram) else "counter"
+            lines.append(f"# HELP {name} {metrics[0].description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class RequestTimings:
+    """
+    Stage durations and dictionary query count for one request, filled in by
+    stage() and count_query() from whichever thread does the work.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_stages(self, stages: Dict[str, float]) -> None:
+        """Adds stages timed elsewhere, e.g. in a batch this request was part of."""
+        with self._lock:
+            for name, seconds in stages.items():
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_queries(self, count: int) -> None:
+        with self._lock:
+            self.queries += count
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        """Formats the stages as a Server-Timing header value, durations in milliseconds."""
+        with self._lock:
+            stages = list(self.stages.items())
+            queries = self.queries
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+        entries.append(f'db;desc="{queries} queries"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def begin_request_timings() -> RequestTimings:
+    """Starts collecting stage timings for the current request (and the work it hands to the pools)."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_request_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Times a block as a pipeline stage: observed in the stage_duration_seconds
+    histogram and added to the current request's Server-Timing, if any.
+    """
+    histogram = registry.histogram(
+        "stage_duration_seconds", "Time spent in each scan and search stage", STAGE_BUCKETS, stage=name
+    )
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        histogram.observe(elapsed)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add_stage(name, elapsed)
+
+
+def count_query() -> None:
+    """Counts one dictionary SQL statement against the current request."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_queries(1)
@@ -0,0 +1,288 @@
+"""
+Interchangeable inference engines for the manga-ocr model, picked with
+OCR_BACKEND:
+
+- torch: the stock MangaOcr PyTorch model
+- torch-int8: the same model with its Linear layers dynamically quantized
+  to int8, smaller and usually faster on CPU
+- onnx: an exported encoder and decoder run with ONNX Runtime, with no
+  torch import at serving time; needs `pip install -r requirements-onnx.txt`
+  and an export made with:
+
+      python -m app.services.ocr_backends export [--output DIR]
+
+  (exporting needs torch and transformers from requirements.txt as well)
+
+Every backend takes the same preprocessed images and returns text
+normalized the way MangaOcr does, so they can be swapped freely and compared
+with `python -m benchmarks ocr-backends`.
+"""
+from pathlib import Path
+from typing import Any, List, Tuple
+import importlib.util
+import argparse
+import abc
+import logging
+import json
+import time
+import re
+
+import jaconv
+from PIL import Image
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["torch", "torch-int8", "onnx"]
+DEFAULT_MODEL = "kha-white/manga-ocr-base"
+# generate()'s limit in MangaOcr.__call__
+MAX_LENGTH = 300
+ONNX_OPSET = 17
+
+# (module, pip package, requirements file) each backend imports when it loads
+_TORCH_PACKAGES = [("torch", "torch", "requirements.txt"), ("transformers", "transformers", "requirements.txt"),
+                   ("manga_ocr", "manga-ocr", "requirements.txt")]
+_ONNX_PACKAGES = [("onnxruntime", "onnxruntime", "requirements-onnx.txt"),
+                  ("transformers", "transformers", "requirements.txt")]
+_REQUIRED_PACKAGES = {"torch": _TORCH_PACKAGES, "torch-int8": _TORCH_PACKAGES, "onnx": _ONNX_PACKAGES}
+_EXPORT_PACKAGES = [("torch", "torch", "requirements.txt"), ("transformers", "transformers", "requirements.txt"),
+                    ("onnx", "onnx", "requirements-onnx.txt")]
+
+
+def post_process(text: str) -> str:
+    """The normalization manga_ocr applies to decoded text, without importing manga_ocr (and torch)."""
+    text = "".join(text.split())
+    text = text.replace("…", "...")
+    text = re.sub("[・.]{2,}", lambda match: (match.end() - match.start()) * ".", text)
+    return jaconv.h2z(text, ascii=True, digit=True)
+
+
+def _processor_input_size(processor: Any) -> Tuple[int, int]:
+    size = getattr(processor, "size", None) or {}
+    if isinstance(size, dict):
+        return size.get("width", 224), size.get("height", 224)
+    return size, size
+
+
+class OcrBackend(abc.ABC):
+    """
+    One loaded OCR model. Inference is split into the same three steps for
+    every engine so scan.run_ocr_batch can time each: prepare turns RGB
+    images into model input, generate runs the model, decode turns its
+    output into text.
+    """
+
+    name = ""
+
+    def __init__(self, processor: Any, tokenizer: Any):
+        self.processor = processor
+        self.tokenizer = tokenizer
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        """(width, height) the processor resizes every image to."""
+        return _processor_input_size(self.processor)
+
+    @abc.abstractmethod
+    def prepare(self, images: List[Image.Image]) -> Any:
+        """Turns RGB images into one batch of model input."""
+
+    @abc.abstractmethod
+    def generate(self, inputs: Any) -> Any:
+        """Runs the model over a prepared batch and returns the generated token ids."""
+
+    def decode(self, generated: Any) -> List[str]:
+        return [post_process(text) for text in self.tokenizer.batch_decode(generated, skip_special_tokens=True)]
+
+
+class TorchOcrBackend(OcrBackend):
+    """MangaOcr's VisionEncoderDecoder model in PyTorch, optionally int8-quantized."""
+
+    def __init__(self, quantize: bool = False):
+        import torch
+        from manga_ocr import MangaOcr
+
+        engine = MangaOcr()
+        super().__init__(engine.processor, engine.tokenizer)
+        self.name = "torch-int8" if quantize else "torch"
+        self.model = engine.model
+        if quantize:
+            # weights stored as int8, activations quantized on the fly; CPU only
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def prepare(self, images: List[Image.Image]) -> Any:
+        return self.processor(images, return_tensors="pt").pixel_values
+
+    def generate(self, inputs: Any) -> Any:
+        import torch
+
+        with torch.inference_mode():
+            return self.model.generate(inputs.to(self.model.device), max_length=MAX_LENGTH).cpu()
+
+
+class OnnxOcrBackend(OcrBackend):
+    """
+    The exported encoder and decoder, each one ONNX Runtime session created
+    at load and reused for every batch. Decoding is greedy and re-runs the
+    decoder over the whole prefix each step; OCR output is a few dozen
+    tokens, so a key/value cache would save little.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: Path, threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer, ViTImageProcessor
+
+        meta_path = model_dir / "export.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(
+                f"No ONNX export in {model_dir}; create one with: python -m app.services.ocr_backends export"
+            )
+        self.meta = json.loads(meta_path.read_text())
+        super().__init__(ViTImageProcessor.from_pretrained(model_dir), AutoTokenizer.from_pretrained(model_dir))
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        providers = ["CPUExecutionProvider"]
+        self.encoder = onnxruntime.InferenceSession(str(model_dir / "encoder.onnx"), options, providers=providers)
+        self.decoder = onnxruntime.InferenceSession(str(model_dir / "decoder.onnx"), options, providers=providers)
+
+    def prepare(self, images: List[Image.Image]) -> Any:
+        return self.processor(images, return_tensors="np").pixel_values
+
+    def generate(self, inputs: Any) -> Any:
+        import numpy as np
+
+        (hidden_states,) = self.encoder.run(None, {"pixel_values": inputs.astype(np.float32)})
+        batch = inputs.shape[0]
+        eos, pad = self.meta["eos_token_id"], self.meta["pad_token_id"]
+        ids = np.full((batch, 1), self.meta["decoder_start_token_id"], dtype=np.int64)
+        finished = np.zeros(batch, dtype=bool)
+        for _ in range(MAX_LENGTH - 1):
+            (logits,) = self.decoder.run(None, {"input_ids": ids, "encoder_hidden_states": hidden_states})
+            next_ids = np.where(finished, pad, logits[:, -1].argmax(axis=-1))
+            ids = np.concatenate([ids, next_ids[:, None]], axis=1)
+            finished |= next_ids == eos
+            if finished.all():
+                break
+        return ids
+
+
+def _require(packages: List[Tuple[str, str, str]], needed_for: str) -> None:
+    missing = [(package, requirements) for module, package, requirements in packages
+               if importlib.util.find_spec(module) is None]
+    if missing:
+        files = " ".join(dict.fromkeys(f"-r {requirements}" for _, requirements in sorted(missing, key=lambda m: m[1])))
+        raise ImportError(
+            f"{needed_for} needs packages that are not installed: {', '.join(package for package, _ in missing)}; "
+            f"run: pip install {files}"
+        )
+
+
+def check_backend(name: str) -> None:
+    """
+    Raises ValueError for an unknown backend name and ImportError naming the
+    packages the backend needs that are not installed. Imports nothing, so it
+    is cheap enough to run at startup.
+    """
+    if name not in _REQUIRED_PACKAGES:
+        raise ValueError(f"Unknown OCR backend '{name}', expected one of {', '.join(BACKENDS)}")
+    _require(_REQUIRED_PACKAGES[name], f"OCR_BACKEND={name}")
+
+
+def load_backend(name: str) -> OcrBackend:
+    """Loads the named backend; raises ValueError for an unknown name and ImportError for missing packages."""
+    check_backend(name)
+    if name == "torch":
+        return TorchOcrBackend()
+    if name == "torch-int8":
+        return TorchOcrBackend(quantize=True)
+    if name == "onnx":
+        return OnnxOcrBackend(Path(config.OCR_ONNX_DIR), threads=config.OCR_TORCH_THREADS)
+    raise ValueError(f"Unknown OCR backend '{name}', expected one of {', '.join(BACKENDS)}")
+
+
+def export_onnx(output: Path, model_name: str = DEFAULT_MODEL) -> None:
+    """Exports the model's encoder and decoder to ONNX, with the processor and tokenizer alongside."""
+    _require(_EXPORT_PACKAGES, "Exporting to ONNX")
+    import torch
+    from transformers import AutoTokenizer, ViTImageProcessor, VisionEncoderDecoderModel
+
+    start = time.perf_counter()
+    output.mkdir(parents=True, exist_ok=True)
+    processor = ViTImageProcessor.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = VisionEncoderDecoderModel.from_pretrained(model_name).eval()
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.encoder = model.encoder
+            # present when the encoder and decoder hidden sizes differ
+            self.projection = getattr(model, "enc_to_dec_proj", None)
+
+        def forward(self, pixel_values):
+            hidden_states = self.encoder(pixel_values=pixel_values).last_hidden_state
+            return self.projection(hidden_states) if self.projection is not None else hidden_states
+
+    class _Decoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = model.decoder
+
+        def forward(self, input_ids, encoder_hidden_states):
+            return self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states).logits
+
+    width, height = _processor_input_size(processor)
+    pixel_values = torch.zeros(1, 3, height, width)
+    with torch.no_grad():
+        hidden_states = _Encoder()(pixel_values)
+        torch.onnx.export(
+            _Encoder(), (pixel_values,), str(output / "encoder.onnx"),
+            input_names=["pixel_values"], output_names=["encoder_hidden_states"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "encoder_hidden_states": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+        torch.onnx.export(
+            _Decoder(), (torch.ones(1, 2, dtype=torch.long), hidden_states), str(output / "decoder.onnx"),
+            input_names=["input_ids", "encoder_hidden_states"], output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "encoder_hidden_states": {0: "batch"},
+                "logits": {0: "batch", 1: "sequence"},
+            },
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    processor.save_pretrained(output)
+    tokenizer.save_pretrained(output)
+
+    decoder_start = model.config.decoder_start_token_id
+    eos = model.config.eos_token_id if model.config.eos_token_id is not None else tokenizer.sep_token_id
+    pad = model.config.pad_token_id if model.config.pad_token_id is not None else tokenizer.pad_token_id
+    (output / "export.json").write_text(json.dumps({
+        "model": model_name,
+        "opset": ONNX_OPSET,
+        "decoder_start_token_id": decoder_start,
+        "eos_token_id": eos,
+        "pad_token_id": pad,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }, indent=2))
+    logger.info(f"Exported {model_name} to {output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prepare alternative OCR inference backends.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export the OCR model to ONNX for the onnx backend")
+    export_parser.add_argument("--output", type=Path, default=Path(config.OCR_ONNX_DIR))
+    export_parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_onnx(args.output, args.model)
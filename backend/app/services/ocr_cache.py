@@ -0,0 +1,254 @@
+from PIL import Image
+from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import threading
+import hashlib
+import logging
+import json
+import sqlite3
+import time
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# rough per-entry bookkeeping cost on top of the text itself
+_ENTRY_OVERHEAD_BYTES = 200
+# near-duplicate matches must also have roughly the same shape
+_MAX_ASPECT_RATIO_DRIFT = 0.1
+
+
+@dataclass(frozen=True)
+class OcrCacheKey:
+    digest: str
+    phash: int
+    width: int
+    height: int
+
+
+@dataclass
+class _CacheEntry:
+    key: OcrCacheKey
+    text: str
+    size: int
+
+
+def _difference_hash(gray: Image.Image) -> int:
+    """64-bit dHash: compares horizontally adjacent pixels of a 9x8 thumbnail."""
+    small = gray.resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def make_cache_key(image: Image.Image) -> OcrCacheKey:
+    """
+    Builds the cache key for an image. MangaOcr only ever sees the grayscale
+    version of a snip, so the key hashes grayscale pixels; the same snip saved
+    as PNG or WebP, or with an alpha channel, maps to the same entry.
+    """
+    gray = image.convert("L")
+    hasher = hashlib.sha256(f"{gray.width}x{gray.height}:".encode())
+    hasher.update(gray.tobytes())
+    return OcrCacheKey(
+        digest=hasher.hexdigest(),
+        phash=_difference_hash(gray),
+        width=gray.width,
+        height=gray.height,
+    )
+
+
+def ocr_config_fingerprint() -> str:
+    """
+    Hash of the settings that change what OCR reads from the same pixels:
+    the backend, the model and the preprocessing.
+    """
+    from app.services import preprocess
+    from app.services.ocr_backends import DEFAULT_MODEL
+
+    model = DEFAULT_MODEL
+    if config.OCR_BACKEND == "onnx":
+        # names the exported model and when it was exported, so a re-export counts as a change
+        meta_path = Path(config.OCR_ONNX_DIR) / "export.json"
+        model = meta_path.read_text() if meta_path.exists() else ""
+    settings = {
+        "backend": config.OCR_BACKEND,
+        "model": model,
+        "preprocess": config.OCR_PREPROCESS,
+        "split_regions": config.OCR_SPLIT_REGIONS,
+        "preprocess_constants": [
+            preprocess.INK_THRESHOLD, preprocess.CROP_PADDING, preprocess.MIN_CROP_PADDING_PX,
+            preprocess.MAX_INPUT_FACTOR, preprocess.SPLIT_GAP_RATIO, preprocess.MIN_SPLIT_GAP_PX,
+            preprocess.MAX_REGIONS,
+        ],
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class OcrResultCache:
+    """
+    Caches OCR text by image content. Lookups try an exact pixel-hash match
+    in the in-memory LRU, then an optional perceptual-hash near match, then
+    the optional on-disk SQLite tier, which survives restarts. The disk tier
+    remembers the fingerprint of the OCR settings it was filled under and is
+    emptied when it opens under different ones.
+    """
+
+    def __init__(self, max_bytes: int, phash_max_distance: int = 0, disk_dir: Optional[Path] = None,
+                 fingerprint: str = ""):
+        self.max_bytes = max_bytes
+        self.phash_max_distance = phash_max_distance
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.near_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._disk: Optional[sqlite3.Connection] = None
+        self.disk_path: Optional[Path] = None
+        if disk_dir is not None and self.enabled:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            self.disk_path = disk_dir / "ocr_cache.sqlite"
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_result ("
+                " digest TEXT PRIMARY KEY, phash INTEGER, width INTEGER, height INTEGER,"
+                " text TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE TABLE IF NOT EXISTS ocr_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = self._disk.execute("SELECT value FROM ocr_meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                dropped = self._disk.execute("DELETE FROM ocr_result").rowcount
+                self._disk.execute("INSERT OR REPLACE INTO ocr_meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+                if dropped > 0:
+                    logger.info(f"OCR settings changed; dropped {dropped} cached results from the disk tier")
+            self._disk.commit()
+            logger.info(f"OCR cache disk tier at {self.disk_path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def lookup(self, image: Image.Image) -> Tuple[OcrCacheKey, Optional[str]]:
+        """Returns the key for the image and the cached text, or None on a miss."""
+        key = make_cache_key(image)
+        return key, self.get(key)
+
+    def get(self, key: OcrCacheKey) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key.digest)
+            if entry is not None:
+                self._entries.move_to_end(key.digest)
+                self.memory_hits += 1
+                return entry.text
+
+            if self.phash_max_distance > 0:
+                entry = self._find_near_match(key)
+                if entry is not None:
+                    self._entries.move_to_end(entry.key.digest)
+                    self.near_hits += 1
+                    return entry.text
+
+            if self._disk is not None:
+                row = self._disk.execute("SELECT text FROM ocr_result WHERE digest = ?", (key.digest,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._store_in_memory(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: OcrCacheKey, text: str) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._store_in_memory(key, text)
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO ocr_result (digest, phash, width, height, text, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (key.digest, key.phash, key.width, key.height, text, time.time()),
+                    )
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing OCR result to disk cache: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM ocr_result")
+                self._disk.commit()
+
+    def _find_near_match(self, key: OcrCacheKey) -> Optional[_CacheEntry]:
+        aspect = key.width / key.height if key.height else 0
+        best: Optional[_CacheEntry] = None
+        best_distance = self.phash_max_distance + 1
+        for entry in self._entries.values():
+            other = entry.key
+            other_aspect = other.width / other.height if other.height else 0
+            if abs(aspect - other_aspect) > _MAX_ASPECT_RATIO_DRIFT * max(aspect, other_aspect, 1e-9):
+                continue
+            distance = (key.phash ^ other.phash).bit_count()
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        return best
+
+    def _store_in_memory(self, key: OcrCacheKey, text: str) -> None:
+        size = len(text.encode("utf-8")) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key.digest, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[key.digest] = _CacheEntry(key=key, text=text, size=size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.near_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "near_hits": self.near_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "disk_path": str(self.disk_path) if self.disk_path else None,
+            }
+
+
+ocr_cache = OcrResultCache(
+    max_bytes=config.OCR_CACHE_MAX_BYTES,
+    phash_max_distance=config.OCR_CACHE_PHASH_DISTANCE,
+    disk_dir=Path(config.OCR_CACHE_DIR) if config.OCR_CACHE_DIR else None,
+    fingerprint=ocr_config_fingerprint() if config.OCR_CACHE_DIR else "",
+)
@@ -0,0 +1,223 @@
+from PIL import Image
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import secrets
+import asyncio
+import logging
+import math
+import time
+
+from app import config
+from app.services.metrics import registry
+from app.services.ocr_scheduler import recognize_image
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# how often abandoned and expired jobs are swept
+_REAP_INTERVAL_S = 1.0
+# weight of the newest job in the running average that Retry-After is based on
+_DURATION_SMOOTHING = 0.2
+
+
+class JobRejectedError(Exception):
+    """Raised when a job cannot be admitted right now; retry_after is a hint in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class OcrJob:
+    id: str
+    client: str
+    status: str = PENDING
+    text: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # refreshed whenever someone asks about the job; a pending job nobody has asked about is abandoned
+    last_seen_at: float = field(default_factory=time.monotonic)
+    watchers: int = 0
+    task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "translated_text": self.text,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class OcrJobManager:
+    """
+    Admission control in front of the OCR scheduler. Every OCR request is a
+    job; at most max_pending jobs are pending at once in total and
+    max_per_client per client, and submissions beyond that are rejected
+    straight away instead of queueing until the client times out.
+
+    Pending jobs that nobody polls or watches for abandon_after_s are
+    cancelled, which drops them from the scheduler queue before inference.
+    Finished jobs are kept for result_ttl_s so they can still be fetched.
+    """
+
+    def __init__(self, max_pending: int, max_per_client: int, abandon_after_s: float, result_ttl_s: float):
+        self.max_pending = max(1, max_pending)
+        self.max_per_client = max(1, max_per_client)
+        self.abandon_after_s = abandon_after_s
+        self.result_ttl_s = result_ttl_s
+        self._jobs: Dict[str, OcrJob] = {}
+        self._pending = 0
+        self._pending_by_client: Dict[str, int] = {}
+        self._average_duration_s = 1.0
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.rejected_queue_full = registry.counter(
+            "ocr_jobs_rejected_total", "OCR jobs turned away by admission control", reason="queue_full"
+        )
+        self.rejected_client_limit = registry.counter(
+            "ocr_jobs_rejected_total", "OCR jobs turned away by admission control", reason="client_limit"
+        )
+        self.cancelled_by_client = registry.counter(
+            "ocr_jobs_cancelled_total", "Pending OCR jobs cancelled before finishing", reason="client"
+        )
+        self.cancelled_abandoned = registry.counter(
+            "ocr_jobs_cancelled_total", "Pending OCR jobs cancelled before finishing", reason="abandoned"
+        )
+
+    def start(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for job in list(self._jobs.values()):
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        self._jobs.clear()
+
+    def _retry_after(self) -> int:
+        # a typical job's duration, about how long until a pending slot frees up
+        return max(1, math.ceil(self._average_duration_s))
+
+    def submit(self, image: Image.Image, client: str) -> OcrJob:
+        """Admits an OCR job for client, or raises JobRejectedError when the queue or the client's share is full."""
+        if self._pending >= self.max_pending:
+            self.rejected_queue_full.inc()
+            raise JobRejectedError(f"OCR queue is full ({self.max_pending} jobs pending).", self._retry_after())
+        if self._pending_by_client.get(client, 0) >= self.max_per_client:
+            self.rejected_client_limit.inc()
+            raise JobRejectedError(
+                f"Too many OCR jobs in progress for this client (limit {self.max_per_client}).", self._retry_after()
+            )
+
+        job = OcrJob(id=secrets.token_urlsafe(12), client=client)
+        self._jobs[job.id] = job
+        self._pending += 1
+        self._pending_by_client[client] = self._pending_by_client.get(client, 0) + 1
+        job.task = asyncio.create_task(self._run(image))
+        # a done callback also runs for a job cancelled before it ever started
+        job.task.add_done_callback(lambda task: self._finish(job, task))
+        return job
+
+    async def _run(self, image: Image.Image) -> str:
+        started_at = time.perf_counter()
+        text = await recognize_image(image)
+        elapsed = time.perf_counter() - started_at
+        self._average_duration_s += _DURATION_SMOOTHING * (elapsed - self._average_duration_s)
+        return text
+
+    def _finish(self, job: OcrJob, task: asyncio.Task) -> None:
+        if task.cancelled():
+            job.status = CANCELLED
+        elif task.exception() is not None:
+            logger.error(f"OCR job {job.id} failed: {task.exception()}")
+            job.status = FAILED
+            job.error = str(task.exception())
+        else:
+            job.status = DONE
+            job.text = task.result()
+        job.finished_at = time.time()
+
+        self._pending -= 1
+        remaining = self._pending_by_client[job.client] - 1
+        if remaining:
+            self._pending_by_client[job.client] = remaining
+        else:
+            del self._pending_by_client[job.client]
+
+    def get(self, job_id: str) -> Optional[OcrJob]:
+        """Looks up a job and marks it as still wanted."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.last_seen_at = time.monotonic()
+        return job
+
+    def cancel(self, job_id: str, abandoned: bool = False) -> Optional[OcrJob]:
+        """Cancels a pending job; finished jobs are returned unchanged."""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == PENDING and job.task is not None:
+            job.task.cancel()
+            (self.cancelled_abandoned if abandoned else self.cancelled_by_client).inc()
+        return job
+
+    async def wait(self, job: OcrJob, timeout: Optional[float] = None) -> OcrJob:
+        """Waits up to timeout seconds for a job to finish, counting the caller as a watcher meanwhile."""
+        if job.task is None or job.task.done():
+            return job
+        job.watchers += 1
+        try:
+            # asyncio.wait neither raises for a failed or cancelled job nor cancels it on timeout
+            await asyncio.wait({job.task}, timeout=timeout)
+        finally:
+            job.watchers -= 1
+            job.last_seen_at = time.monotonic()
+        return job
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(_REAP_INTERVAL_S)
+            now_monotonic, now = time.monotonic(), time.time()
+            for job in list(self._jobs.values()):
+                if job.status == PENDING:
+                    if not job.watchers and now_monotonic - job.last_seen_at > self.abandon_after_s:
+                        logger.info(f"Cancelling abandoned OCR job {job.id}")
+                        self.cancel(job.id, abandoned=True)
+                elif job.finished_at is not None and now - job.finished_at > self.result_ttl_s:
+                    del self._jobs[job.id]
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "max_per_client": self.max_per_client,
+            "clients_with_pending_jobs": len(self._pending_by_client),
+            "jobs_tracked": len(self._jobs),
+            "average_job_seconds": round(self._average_duration_s, 3),
+            "rejected": {
+                "queue_full": int(self.rejected_queue_full.value),
+                "client_limit": int(self.rejected_client_limit.value),
+            },
+            "cancelled": {
+                "client": int(self.cancelled_by_client.value),
+                "abandoned": int(self.cancelled_abandoned.value),
+            },
+        }
+
+
+ocr_jobs = OcrJobManager(
+    max_pending=config.OCR_JOB_QUEUE_SIZE,
+    max_per_client=config.OCR_JOB_CLIENT_LIMIT,
+    abandon_after_s=config.OCR_JOB_ABANDON_SECONDS,
+    result_ttl_s=config.OCR_JOB_RESULT_TTL_SECONDS,
+)
@@ -0,0 +1,184 @@
+from PIL import Image
+from typing import Callable, List, Optional, Set
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import time
+
+from app import config
+from app.services.executors import run_in_ocr_pool
+from app.services.metrics import RequestTimings, begin_request_timings, current_request_timings, registry, stage
+from app.services.ocr_cache import ocr_cache
+from app.services.scan import run_ocr_batch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingOcr:
+    image: Image.Image
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # the submitting request's timings; the batch's stages run in the scheduler's context, not the request's
+    timings: Optional[RequestTimings] = field(default_factory=current_request_timings)
+
+
+class OcrScheduler:
+    """
+    Collects concurrent OCR requests into a queue and flushes them to the
+    model as one batch, either when max_batch_size requests are waiting or
+    when the oldest request has waited max_wait_ms. Each caller gets back the
+    text for its own image.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: int, max_concurrent_batches: int = 1,
+                 batch_fn: Callable[[List[Image.Image]], List[str]] = run_ocr_batch):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._batch_fn = batch_fn
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        self.batch_size_histogram = registry.histogram(
+            "ocr_batch_size", "Number of images per OCR forward pass",
+            buckets=[1, 2, 4, 8, 16, 32],
+        )
+        self.queue_wait_histogram = registry.histogram(
+            "ocr_queue_wait_seconds", "Time an OCR request waited before its batch started",
+            buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+        )
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"OCR scheduler started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_s * 1000:g})")
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        for task in list(self._in_flight):
+            task.cancel()
+
+        while self._queue is not None and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("OCR scheduler stopped"))
+        logger.info("OCR scheduler stopped")
+
+    async def submit(self, image: Image.Image) -> str:
+        """Queues an image for OCR and waits for its text."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingOcr(image=image, future=future))
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingOcr]:
+        first = await self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # take whatever is already queued without waiting any longer
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # callers that gave up (e.g. client disconnected) are not worth inference
+        return [pending for pending in batch if not pending.future.done()]
+
+    async def _run(self) -> None:
+        while True:
+            # hold a slot before collecting so requests keep accumulating into
+            # the next batch while every OCR worker is busy
+            await self._batch_slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._batch_slots.release()
+                raise
+            if not batch:
+                self._batch_slots.release()
+                continue
+
+            task = asyncio.create_task(self._process_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _process_batch(self, batch: List[_PendingOcr]) -> None:
+        try:
+            # this task's own collector, copied onto each request of the batch once it is done
+            batch_timings = begin_request_timings()
+            started_at = time.perf_counter()
+            self.batch_size_histogram.observe(len(batch))
+            for pending in batch:
+                self.queue_wait_histogram.observe(started_at - pending.enqueued_at)
+
+            try:
+                results = await run_in_ocr_pool(self._batch_fn, [p.image for p in batch])
+            except Exception as e:
+                logger.error(f"Error during batched OCR of {len(batch)} images: {e}", exc_info=True)
+                for pending in batch:
+                    if not pending.future.done():
+                        if pending.timings is not None:
+                            pending.timings.add_stages(batch_timings.stages)
+                        pending.future.set_exception(Exception(f"Failed during OCR operation: {str(e)}"))
+                return
+
+            logger.info(f"OCR batch of {len(batch)} finished in {time.perf_counter() - started_at:.3f}s")
+            for pending, text in zip(batch, results):
+                if not pending.future.done():
+                    if pending.timings is not None:
+                        pending.timings.add_stages(batch_timings.stages)
+                    pending.future.set_result(text)
+        finally:
+            self._batch_slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_in_flight": len(self._in_flight),
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_seconds": self.queue_wait_histogram.snapshot(),
+        }
+
+
+ocr_scheduler = OcrScheduler(
+    max_batch_size=config.OCR_MAX_BATCH_SIZE,
+    max_wait_ms=config.OCR_MAX_WAIT_MS,
+    max_concurrent_batches=config.OCR_WORKERS,
+)
+
+
+async def recognize_image(image: Image.Image) -> str:
+    """OCRs an image through the result cache and the batching scheduler."""
+    if not ocr_cache.enabled:
+        with stage("ocr"):
+            return await ocr_scheduler.submit(image)
+
+    with stage("ocr_cache_lookup"):
+        cache_key, extracted_text = await asyncio.to_thread(ocr_cache.lookup, image)
+    if extracted_text is None:
+        # queue wait plus this request's share of a batched forward pass
+        with stage("ocr"):
+            extracted_text = await ocr_scheduler.submit(image)
+        await asyncio.to_thread(ocr_cache.put, cache_key, extracted_text)
+    return extracted_text
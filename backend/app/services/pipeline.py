@@ -0,0 +1,118 @@
+from PIL import Image
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+import threading
+import asyncio
+import logging
+import time
+
+import fugashi
+import jaconv
+
+from app.services.executors import run_in_search_pool
+from app.services.kanji_index import is_kanji
+from app.services.metrics import stage
+from app.services.ocr_scheduler import recognize_image
+from app.services.search import search_general, search_kanji
+
+logger = logging.getLogger(__name__)
+
+# unidic part-of-speech groups that are not worth a dictionary lookup
+_SKIPPED_POS = {"補助記号", "空白", "記号", "助詞", "助動詞"}
+# word results sent per token; the full list is one /search/general call away
+MAX_WORD_RESULTS_PER_TOKEN = 3
+
+_thread_local = threading.local()
+
+
+def _get_tagger() -> fugashi.Tagger:
+    # MeCab taggers are not safe to share between threads
+    tagger = getattr(_thread_local, "tagger", None)
+    if tagger is None:
+        tagger = fugashi.Tagger()
+        _thread_local.tagger = tagger
+    return tagger
+
+
+@stage("tokenize")
+def tokenize_text(text: str) -> List[Dict[str, Any]]:
+    """Segments Japanese text with fugashi/unidic-lite into surface, base form, reading and part of speech."""
+    tokens = []
+    for word in _get_tagger()(text):
+        feature = word.feature
+        base = getattr(feature, "orthBase", None) or getattr(feature, "lemma", None) or word.surface
+        kana = getattr(feature, "kana", None) or ""
+        pos = getattr(feature, "pos1", None) or ""
+        tokens.append({
+            "surface": word.surface,
+            "base": base,
+            "reading": jaconv.kata2hira(kana) if kana and kana != "*" else "",
+            "pos": pos,
+            "lookup": pos not in _SKIPPED_POS and not word.is_unk,
+        })
+    return tokens
+
+
+def _top_word_results(results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return list(results.get("results", [])[:MAX_WORD_RESULTS_PER_TOKEN])
+
+
+async def run_scan_pipeline(
+    image: Image.Image, recognize: Callable[[Image.Image], Awaitable[str]] = recognize_image
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs OCR, tokenization and dictionary lookups for one snip, yielding an
+    event as each stage finishes: 'text', then 'tokens', then one 'word' or
+    'kanji' event per lookup in completion order, then 'done'. recognize
+    does the OCR step; the scan routes pass one that goes through the job
+    queue.
+    """
+    started_at = time.perf_counter()
+
+    def _elapsed_ms() -> float:
+        return round((time.perf_counter() - started_at) * 1000, 1)
+
+    text = await recognize(image)
+    yield {"event": "text", "data": {"text": text, "elapsed_ms": _elapsed_ms()}}
+
+    tokens = await run_in_search_pool(tokenize_text, text)
+    yield {"event": "tokens", "data": {"tokens": tokens, "elapsed_ms": _elapsed_ms()}}
+
+    token_indexes: Dict[str, List[int]] = {}
+    for i, token in enumerate(tokens):
+        if token["lookup"]:
+            token_indexes.setdefault(token["base"], []).append(i)
+    kanji_chars = list(dict.fromkeys(char for char in text if is_kanji(char)))
+
+    async def _lookup_word(base: str) -> Dict[str, Any]:
+        results = await run_in_search_pool(search_general, base, MAX_WORD_RESULTS_PER_TOKEN)
+        return {"event": "word", "data": {
+            "query": base,
+            "token_indexes": token_indexes[base],
+            "results": _top_word_results(results),
+        }}
+
+    async def _lookup_kanji(char: str) -> Dict[str, Any]:
+        info = await run_in_search_pool(search_kanji, char)
+        return {"event": "kanji", "data": {"kanji": char, "found": info is not None, "info": info}}
+
+    tasks = [asyncio.ensure_future(_lookup_word(base)) for base in token_indexes]
+    tasks += [asyncio.ensure_future(_lookup_kanji(char)) for char in kanji_chars]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                event = await next_done
+            except Exception as e:
+                logger.error(f"Lookup failed in scan pipeline: {e}", exc_info=True)
+                continue
+            event["data"]["elapsed_ms"] = _elapsed_ms()
+            yield event
+    finally:
+        # the client may have gone away mid-stream
+        for task in tasks:
+            task.cancel()
+
+    yield {"event": "done", "data": {
+        "words": len(token_indexes),
+        "kanji": len(kanji_chars),
+        "elapsed_ms": _elapsed_ms(),
+    }}
@@ -0,0 +1,137 @@
+"""
+Cheap image clean-up before OCR inference. Snips are often full-DPI
+screenshot regions with wide blank margins, while the model only ever sees
+a small fixed-size input, so most of their pixels are wasted work in the
+image processor. Preprocessing converts to grayscale, crops the blank
+border, shrinks each axis to a small multiple of the model input and can
+split a snip holding several bubbles into one region per bubble.
+"""
+from PIL import Image
+from typing import List, Optional, Tuple
+import statistics
+
+import numpy as np
+
+# how far a pixel must differ from the background to count as ink (0-255)
+INK_THRESHOLD = 48
+# blank border kept around the text after cropping, as a fraction of the text box
+CROP_PADDING = 0.05
+MIN_CROP_PADDING_PX = 4
+# each axis is kept at no less than this multiple of the model input, so the
+# processor's own resize still has detail to work with
+MAX_INPUT_FACTOR = 2
+# a blank band splits regions when it is at least this many times as thick as a line of text
+SPLIT_GAP_RATIO = 1.0
+MIN_SPLIT_GAP_PX = 8
+MAX_REGIONS = 16
+
+Box = Tuple[int, int, int, int]
+
+
+def ink_mask(gray: Image.Image) -> np.ndarray:
+    """True where a pixel stands out from the background, judged by the median border pixel."""
+    pixels = np.asarray(gray, dtype=np.int16)
+    # the border is mostly background in any snip worth reading
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    return np.abs(pixels - int(np.median(border))) > INK_THRESHOLD
+
+
+def _bbox(mask: np.ndarray) -> Optional[Box]:
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    columns = np.flatnonzero(mask.any(axis=0))
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+
+def _pad(box: Box, size: Tuple[int, int]) -> Box:
+    left, top, right, bottom = box
+    pad_x = max(MIN_CROP_PADDING_PX, int((right - left) * CROP_PADDING))
+    pad_y = max(MIN_CROP_PADDING_PX, int((bottom - top) * CROP_PADDING))
+    return max(0, left - pad_x), max(0, top - pad_y), min(size[0], right + pad_x), min(size[1], bottom + pad_y)
+
+
+def _runs(profile: List[int]) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Splits a projection profile into (start, end) runs of ink and of blank space between them."""
+    ink: List[Tuple[int, int]] = []
+    start = None
+    for i, value in enumerate(profile + [0]):
+        if value and start is None:
+            start = i
+        elif not value and start is not None:
+            ink.append((start, i))
+            start = None
+    gaps = [(ink[i][1], ink[i + 1][0]) for i in range(len(ink) - 1)]
+    return ink, gaps
+
+
+def _split_axis(mask: np.ndarray, box: Box, vertical_cut: bool) -> List[Box]:
+    left, top, right, bottom = box
+    # whether each column (or row) of the box has any ink
+    profile = mask[top:bottom, left:right].any(axis=0 if vertical_cut else 1).tolist()
+    ink, gaps = _runs(profile)
+    if not gaps:
+        return [box]
+
+    text_size = statistics.median(end - start for start, end in ink)
+    min_gap = max(MIN_SPLIT_GAP_PX, SPLIT_GAP_RATIO * text_size)
+    cuts = [(start + end) // 2 for start, end in gaps if end - start >= min_gap]
+    if not cuts:
+        return [box]
+
+    edges = [0] + cuts + [len(profile)]
+    if vertical_cut:
+        parts = [(left + a, top, left + b, bottom) for a, b in zip(edges, edges[1:])]
+        # side-by-side bubbles are read right to left
+        return parts[::-1]
+    return [(left, top + a, right, top + b) for a, b in zip(edges, edges[1:])]
+
+
+def split_regions(mask: np.ndarray) -> List[Box]:
+    """
+    Cuts a snip along wide blank bands into text regions in manga reading
+    order: top to bottom, then right to left within each band. Gaps no
+    wider than a line of text (the spacing inside a bubble) are not cut.
+    """
+    height, width = mask.shape
+    regions: List[Box] = []
+    for band in _split_axis(mask, (0, 0, width, height), vertical_cut=False):
+        regions.extend(_split_axis(mask, band, vertical_cut=True))
+    # trim each region to its own ink and drop ones that hold none
+    trimmed = []
+    for left, top, right, bottom in regions:
+        bbox = _bbox(mask[top:bottom, left:right])
+        if bbox is not None:
+            trimmed.append((left + bbox[0], top + bbox[1], left + bbox[2], top + bbox[3]))
+    return trimmed if len(trimmed) <= MAX_REGIONS else [(0, 0, width, height)]
+
+
+def downscale(image: Image.Image, input_size: Tuple[int, int]) -> Image.Image:
+    """
+    Shrinks each axis by an integer factor to no less than MAX_INPUT_FACTOR
+    times the model input. The processor stretches every image to the input
+    size regardless of aspect ratio, so each axis is handled on its own.
+    """
+    factor_x = max(1, image.width // (input_size[0] * MAX_INPUT_FACTOR))
+    factor_y = max(1, image.height // (input_size[1] * MAX_INPUT_FACTOR))
+    if factor_x == 1 and factor_y == 1:
+        return image
+    return image.reduce((factor_x, factor_y))
+
+
+def preprocess_image(image: Image.Image, input_size: Tuple[int, int], split: bool = False) -> List[Image.Image]:
+    """
+    Grayscale, blank-border crop and downscale of one snip; with split, one
+    image per text region in reading order. Always returns at least one
+    image, so a blank snip still gets OCR'd (and comes back empty).
+    """
+    gray = image.convert("L")
+    mask = ink_mask(gray)
+    if split:
+        boxes = split_regions(mask)
+    else:
+        bbox = _bbox(mask)
+        boxes = [bbox] if bbox is not None else []
+    if not boxes:
+        return [downscale(gray, input_size).convert("RGB")]
+    return [downscale(gray.crop(_pad(box, gray.size)), input_size).convert("RGB") for box in boxes]
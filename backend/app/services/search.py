@@ -1,12 +1,52 @@
 from jamdict import Jamdict
 from jamdict import jmdict
-from typing import List, Dict, Union, Set
+from typing import List, Dict, Optional, Union, Set
+import threading
 import logging
 
-jam = Jamdict()
+from app import config
+from app.services.kanji_index import get_reading_index, get_word_index, priority_score
+from app.services.search_cache import SearchResultCache, normalize_query
+from app.services.kanji_store import get_kanji_store
+from app.services.dictionary_db import dictionary_pool
+from app.services.metrics import stage
+from app.services.gloss_index import GlossMatch, get_gloss_index
+from app.services.suggest import romaji_to_hiragana
+from app.services.word_core import WordCore, get_word_core
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+_jam: Optional[Jamdict] = None
+_jam_lock = threading.Lock()
+
+# how many of a kanji's best-ranked words are fetched for examples and sentences
+MAX_WORD_ENTRIES_PER_KANJI = 20
+# stays under SQLite's bound-parameter limit on older builds
+SQL_IN_CHUNK_SIZE = 500
+# general search page size when the caller does not ask for one, and the cap
+DEFAULT_GENERAL_PAGE_SIZE = 50
+MAX_GENERAL_PAGE_SIZE = 200
+
+_MISSING = object()
+
+
+def get_jam() -> Jamdict:
+    """
+    Returns the shared Jamdict instance. It never opens connections of its
+    own (reuse_ctx is off); every call passes a pooled context from
+    dictionary_pool.jamdict_context, so one instance serves all threads.
+    """
+    global _jam
+    if _jam is None:
+        with _jam_lock:
+            if _jam is None:
+                jam = Jamdict(reuse_ctx=False)
+                # the sources are created lazily; do it once here rather than racing on first use
+                jam.jmdict, jam.kd2
+                _jam = jam
+    return _jam
+
 class KanjiInfo:
     def __init__(self, kanji: str, meanings: List[str], onYomi: List[str], kunYomi: List[str],
                  strokeCount: int, jlptLevel: str, frequency: int,
@@ -37,13 +77,57 @@ def get_jlpt_level_approx(grade: Union[int, None]) -> str:
     return "N/A"
 
 
-def search_kanji(search_term: str) -> Union[Dict[str, any], None]:
+@stage("kanji_similar")
+def _find_similar_kanji(kanji_literal: str, on_yomi: List[str], kun_yomi: List[str]) -> List[Dict[str, any]]:
+    """Up to 7 kanji sharing a reading with kanji_literal, longest kun'yomi first, then on'yomi."""
+    similar_kanji_data: List[Dict[str, str]] = []
+    processed_similar_kanji: Set[str] = set()
+
+    # affix forms like '-か' never matched a dictionary word in the old
+    # per-word lookup, so they are not used to pick similar kanji
+    sorted_kun_yomi = sorted([k for k in kun_yomi if k and not k.startswith('-') and not k.endswith('-')], key=len, reverse=True)
+    on_yomi_to_search = [o for o in on_yomi if o]
+
+    readings_to_process = sorted_kun_yomi + on_yomi_to_search
+
+    logger.info(f"[{kanji_literal}] Finding related kanji. Prioritized Kun'yomi (longest first): {sorted_kun_yomi}, On'yomi: {on_yomi_to_search}")
+
+    try:
+        reading_index = get_reading_index()
+        for reading in readings_to_process:
+            if len(similar_kanji_data) >= 7:
+                break
+            for related_literal in reading_index.kanji_for_reading(reading):
+                if len(similar_kanji_data) >= 7:
+                    break
+                if related_literal == kanji_literal or related_literal in processed_similar_kanji:
+                    continue
+
+                related = reading_index.get(related_literal)
+                logger.debug(f"[{kanji_literal}] Found related kanji: '{related_literal}' shares reading '{reading}'")
+                similar_kanji_data.append({
+                    "kanji": related_literal,
+                    "shared_reading": reading,
+                    "all_on_yomi": list(related.on_yomi),
+                    "all_kun_yomi": list(related.kun_yomi),
+                    "meanings": list(related.meanings[:3])
+                })
+                processed_similar_kanji.add(related_literal)
+    except Exception as e_sim:
+        logger.error(f"Error finding similar kanji for {kanji_literal}: {e_sim}", exc_info=True)
+    return similar_kanji_data
+
+
+def compute_kanji_info(search_term: str) -> Union[Dict[str, any], None]:
+    """Builds the full kanji detail response from the dictionary, bypassing the result cache."""
     if not search_term or len(search_term) != 1:
         logger.warning(f"Search term must be a single character: '{search_term}'")
         return None
 
+    jam = get_jam()
     try:
-        kanji_char_results = jam.lookup(f"k:{search_term}")
+        with stage("kanji_lookup"), dictionary_pool.jamdict_context(jam.jmdict) as ctx:
+            kanji_char_results = jam.lookup(f"k:{search_term}", ctx=ctx)
         if not kanji_char_results or not kanji_char_results.chars:
             logger.info(f"No character info found for Kanji: {search_term}")
             return None
@@ -63,7 +147,7 @@ def search_kanji(search_term: str) -> Union[Dict[str, any], None]:
         if char_idseq and jam.kd2:
             logger.info(f"[{kanji_literal}] Attempting direct DB query for readings using idseq: {char_idseq}")
             try:
-                with jam.kd2.ctx() as ctx:
+                with stage("kanji_readings_sql"), dictionary_pool.jamdict_context(jam.jmdict) as ctx:
                     query = "SELECT r_type, value FROM reading WHERE idseq = ? AND r_type IN ('ja_on', 'ja_kun')"
                     rows = ctx.select(query, params=(char_idseq,))
                     raw_sql_readings = [(row['r_type'], row['value']) for row in rows]
@@ -116,16 +200,26 @@ def search_kanji(search_term: str) -> Union[Dict[str, any], None]:
         logger.info(f"[{kanji_literal}] Final KunYomi: {kun_yomi}")
 
         stroke_count = char_info.stroke_count if hasattr(char_info, 'stroke_count') else 0
-        jlpt_level = get_jlpt_level_approx(getattr(char_info, 'grade', None))
+        grade = getattr(char_info, 'grade', None)
+        # KANJIDIC2 stores the grade as text
+        jlpt_level = get_jlpt_level_approx(int(grade) if isinstance(grade, str) and grade.isdigit() else grade)
         frequency = getattr(char_info, 'freq', 0) or 0
 
         example_words_data: List[Dict[str, str]] = []
-        word_lookup_query = f"%{kanji_literal}%"
+        word_entries: List[jmdict.JMDEntry] = []
         try:
-            word_results = jam.lookup(word_lookup_query, lookup_chars=False, lookup_ne=False)
-            if word_results and word_results.entries:
+            # only the best-ranked words containing the kanji are needed for
+            # 7 examples and 5 sentences, so fetch just those by idseq
+            word_ids = get_word_index().entries_for_kanji(kanji_literal)[:MAX_WORD_ENTRIES_PER_KANJI]
+            with stage("kanji_examples"), dictionary_pool.jamdict_context(jam.jmdict) as ctx:
+                for idseq in word_ids:
+                    entry = jam.jmdict.get_entry(idseq, ctx=ctx)
+                    if entry is not None:
+                        word_entries.append(entry)
+
+            if word_entries:
                 processed_words: Set[str] = set()
-                for entry in word_results.entries:
+                for entry in word_entries:
                     found_in_kanji_form = False
                     word_display = ""
                     
@@ -167,108 +261,13 @@ def search_kanji(search_term: str) -> Union[Dict[str, any], None]:
             logger.error(f"Error fetching/processing example words for {kanji_literal}: {e_ex}", exc_info=True)
 
 
-        similar_kanji_data: List[Dict[str, str]] = []
-        processed_similar_kanji: Set[str] = set()
-        
-        sorted_kun_yomi = sorted([k for k in kun_yomi if k], key=len, reverse=True)
-        on_yomi_to_search = [o for o in on_yomi if o]
-
-        readings_to_process = sorted_kun_yomi + on_yomi_to_search
-        
-        logger.info(f"[{kanji_literal}] Finding related kanji. Prioritized Kun'yomi (longest first): {sorted_kun_yomi}, On'yomi: {on_yomi_to_search}")
-
-        for reading in readings_to_process:
-            if len(similar_kanji_data) >= 7:
-                break
-
-            try:
-                query_str = reading
-                logger.info(f"[{kanji_literal}] Looking up related kanji with general query for reading: '{query_str}'")
-                
-                reading_entry_results = jam.lookup(query_str, lookup_chars=False, lookup_ne=False) 
-                
-                if reading_entry_results and reading_entry_results.entries:
-                    logger.info(f"[{kanji_literal}] Found {len(reading_entry_results.entries)} potential entries for reading string '{reading}'")
-                    for entry in reading_entry_results.entries:
-                        if len(similar_kanji_data) >= 7: break
-
-                        if entry.kanji_forms:
-                            for k_form in entry.kanji_forms:
-                                if not k_form.text: continue
-                                if len(similar_kanji_data) >= 7: break
-
-                                logger.debug(f"[{kanji_literal}] Processing word entry: '{entry.text() if hasattr(entry, 'text') else 'N/A'}', k_form: '{k_form.text}' for original reading '{reading}'")
-
-                                for char_in_word in k_form.text:
-                                    if len(similar_kanji_data) >= 7: break
-                                    if not ('\u4e00' <= char_in_word <= '\u9fef'):
-                                        continue 
-                                        
-                                    if char_in_word == kanji_literal: 
-                                        continue
-                                    if char_in_word in processed_similar_kanji: 
-                                        continue
-
-                                    try:
-                                        logger.debug(f"[{kanji_literal}] Checking relatedness of KANJI '{char_in_word}' (from word '{k_form.text}') with original reading '{reading}'")
-                                        related_char_lookup = jam.lookup(f"k:{char_in_word}")
-                                        if related_char_lookup and related_char_lookup.chars:
-                                            related_char_info = related_char_lookup.chars[0]
-                                            
-                                            temp_on_related = []
-                                            temp_kun_related = []
-                                            if hasattr(related_char_info, 'rm_groups') and related_char_info.rm_groups:
-                                                for group_rel in related_char_info.rm_groups:
-                                                    if hasattr(group_rel, 'readings') and group_rel.readings:
-                                                        for r_rel in group_rel.readings:
-                                                            if hasattr(r_rel, 'r_type') and hasattr(r_rel, 'value'):
-                                                                if r_rel.r_type == 'ja_on':
-                                                                    temp_on_related.append(r_rel.value)
-                                                                elif r_rel.r_type == 'ja_kun':
-                                                                    temp_kun_related.append(r_rel.value)
-                                            
-                                            if not temp_on_related and hasattr(related_char_info, 'ja_on') and related_char_info.ja_on:
-                                                temp_on_related.extend(list(related_char_info.ja_on))
-                                            if not temp_kun_related and hasattr(related_char_info, 'ja_kun') and related_char_info.ja_kun:
-                                                temp_kun_related.extend(list(related_char_info.ja_kun))
-
-                                            temp_on_related = sorted(list(set(temp_on_related)))
-                                            temp_kun_related = sorted(list(set(temp_kun_related)))
-
-                                            related_meanings = list(related_char_info.meanings()) if hasattr(related_char_info, 'meanings') and callable(related_char_info.meanings) else []
-
-                                            logger.debug(f"[{kanji_literal}] For '{char_in_word}': Original reading to check='{reading}'. Its OnYomi={temp_on_related}, KunYomi={temp_kun_related}, Meanings={related_meanings[:2]}")
-
-                                            if reading in temp_on_related or reading in temp_kun_related:
-                                                logger.info(f"[{kanji_literal}] Found related kanji: '{char_in_word}' shares reading '{reading}' (Source word: '{k_form.text}')")
-                                                similar_kanji_data.append({
-                                                    "kanji": char_in_word,
-                                                    "shared_reading": reading,
-                                                    "all_on_yomi": temp_on_related,
-                                                    "all_kun_yomi": temp_kun_related,
-                                                    "meanings": related_meanings[:3]
-                                                })
-                                                processed_similar_kanji.add(char_in_word)
-                                            else:
-                                                logger.debug(f"[{kanji_literal}] '{char_in_word}' does NOT share original reading '{reading}'.")
-                                        else:
-                                            logger.warning(f"[{kanji_literal}] No char_info for '{char_in_word}' when checking relatedness (source word: '{k_form.text}').")
-                                    except Exception as e_related_check:
-                                        logger.error(f"[{kanji_literal}] Error checking relatedness of '{char_in_word}' for reading '{reading}': {e_related_check}", exc_info=True)
-                                        
-                                if len(similar_kanji_data) >= 7: break
-                else:
-                    logger.info(f"[{kanji_literal}] No entries found for reading '{reading}'")
-
-            except Exception as e_sim:
-                logger.error(f"Error finding similar kanji for reading '{reading}' of {kanji_literal}: {e_sim}", exc_info=True)
-        
+        similar_kanji_data = _find_similar_kanji(kanji_literal, on_yomi, kun_yomi)
         logger.info(f"[{kanji_literal}] Found {len(similar_kanji_data)} similar kanji in total.")
 
         sentences_data: List[Dict[str, str]] = []
         try:
-            if 'word_results' in locals() and word_results and word_results.entries:
-                for entry in word_results.entries:
+            if word_entries:
+                for entry in word_entries:
                     if not any(k_form.text and kanji_literal in k_form.text for k_form in entry.kanji_forms if k_form.text):
                         continue
 
@@ -398,13 +397,136 @@ def _format_entry_for_frontend(entry: jmdict.JMDEntry) -> Dict[str, any]:
         "senses": senses_data,
     }
 
-def search_general(query_string: str) -> Dict[str, List[Dict[str, any]]]:
+@stage("general_match")
+def _matching_entry_ids(conn, query_string: str) -> List[int]:
     """
-    Performs a general search using Jamdict for words, kanji, kana, or English.
-    If the query is a single Kanji, it also includes detailed Kanji information.
+    The idseqs jamdict's lookup would return for a query, without building
+    the entries: exact matches on a kanji form, kana form or gloss, or LIKE
+    matches when the query contains a '%', '_' or '@' wildcard.
     """
-    all_results: List[Dict[str, any]] = []
+    if query_string.startswith("id#"):
+        try:
+            return [row[0] for row in conn.execute("SELECT idseq FROM Entry WHERE idseq = ?", (int(query_string[3:]),))]
+        except ValueError:
+            return []
+    if not query_string or query_string == "%":
+        return []
+    op = "LIKE" if any(c in query_string for c in "%_@") else "="
+    rows = conn.execute(
+        f"SELECT idseq FROM Entry WHERE idseq IN (SELECT idseq FROM Kanji WHERE text {op} ?)"
+        f" OR idseq IN (SELECT idseq FROM Kana WHERE text {op} ?)"
+        f" OR idseq IN (SELECT s.idseq FROM Sense s JOIN SenseGloss g ON g.sid = s.ID WHERE g.text {op} ?)",
+        (query_string, query_string, query_string),
+    )
+    return [row[0] for row in rows]
+
+
+@stage("general_rank")
+def _rank_entry_ids(conn, core: Optional[WordCore], query_forms: Set[str], idseqs: List[int],
+                    gloss_matches: Optional[Dict[int, GlossMatch]] = None,
+                    romaji_forms: Set[str] = frozenset()) -> List[int]:
+    """
+    Orders matched entries by relevance and drops duplicate-like entries (same
+    kanji forms, kana forms and first gloss), keeping the best-ranked one.
+    Entries with a form in query_forms come first, then those whose English
+    gloss matched exactly, then those with a form in romaji_forms (an ASCII
+    query read as romaji: "name" is an English word before it is なめ), then
+    other gloss matches. Within each, entries matched on their first sense,
+    then by JMdict priority tags, then by how early the matching sense is,
+    then shorter forms and full-text rank.
+
+    Common words come from the in-memory word core (None when it is off);
+    only the rest are read from the database.
+    """
+    forms: Dict[int, List[str]] = {}
+    kanji_forms: Dict[int, List[str]] = {}
+    kana_forms: Dict[int, List[str]] = {}
+    tags: Dict[int, Set[str]] = {}
+    first_gloss: Dict[int, str] = {}
+    scores: Dict[int, int] = {}
+    missing = idseqs
+    if core is not None:
+        core_entries, missing = core.split(idseqs)
+        for idseq, entry in core_entries.items():
+            kanji_forms[idseq] = list(entry.kanji_forms)
+            kana_forms[idseq] = list(entry.kana_forms)
+            forms[idseq] = list(entry.forms)
+            first_gloss[idseq] = entry.first_gloss
+            scores[idseq] = entry.priority
+    for offset in range(0, len(missing), SQL_IN_CHUNK_SIZE):
+        chunk = missing[offset:offset + SQL_IN_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        for table, tag_table, target in (("Kanji", "KJP", kanji_forms), ("Kana", "KNP", kana_forms)):
+            rows = conn.execute(
+                f"SELECT f.idseq, f.text, f.ID, p.text FROM {table} f LEFT JOIN {tag_table} p ON p.kid = f.ID"
+                f" WHERE f.idseq IN ({placeholders}) ORDER BY f.ID",
+                chunk,
+            )
+            seen_forms: Set[int] = set()
+            for idseq, text, form_id, tag in rows:
+                if form_id not in seen_forms:
+                    seen_forms.add(form_id)
+                    if text:
+                        target.setdefault(idseq, []).append(text)
+                        forms.setdefault(idseq, []).append(text)
+                if tag:
+                    tags.setdefault(idseq, set()).add(tag)
+        rows = conn.execute(
+            f"SELECT s.idseq, g.text FROM Sense s JOIN SenseGloss g ON g.sid = s.ID"
+            f" WHERE s.idseq IN ({placeholders}) ORDER BY s.ID, g.rowid",
+            chunk,
+        )
+        for idseq, text in rows:
+            first_gloss.setdefault(idseq, text)
+
+    gloss_matches = gloss_matches or {}
+
+    def _match_tier(entry_forms: List[str], gloss_match: Optional[GlossMatch]) -> int:
+        if query_forms.intersection(entry_forms):
+            return 0
+        if gloss_match is not None:
+            return 1 if gloss_match.exact else 3
+        # entries matched on an exact form or gloss by SQL have no gloss match
+        return 2 if romaji_forms.intersection(entry_forms) else 1
+
+    def _relevance(idseq: int) -> tuple:
+        entry_forms = forms.get(idseq, [])
+        gloss_match = gloss_matches.get(idseq)
+        return (
+            _match_tier(entry_forms, gloss_match),
+            0 if gloss_match is None or gloss_match.sense_index == 0 else 1,
+            scores[idseq] if idseq in scores else priority_score(tags.get(idseq, ())),
+            gloss_match.sense_index if gloss_match else 0,
+            min((len(text) for text in entry_forms), default=0),
+            gloss_match.score if gloss_match else 0.0,
+            idseq,
+        )
+
+    ranked: List[int] = []
     processed_entry_keys: Set[tuple] = set()
+    for idseq in sorted(idseqs, key=_relevance):
+        entry_key = (
+            tuple(sorted(kanji_forms.get(idseq, []))),
+            tuple(sorted(kana_forms.get(idseq, []))),
+            first_gloss.get(idseq) or "",
+        )
+        if entry_key in processed_entry_keys:
+            logger.info(f"Skipping duplicate-like entry for key: {entry_key}")
+            continue
+        processed_entry_keys.add(entry_key)
+        ranked.append(idseq)
+    return ranked
+
+
+def compute_general_search(query_string: str) -> List[List[Union[str, int]]]:
+    """
+    Finds and ranks everything a general search for words, kanji, kana or
+    English returns, as a list of [type, key] references: ["kanji_detail",
+    literal] for a single-kanji query, then ["word", idseq] in relevance
+    order. Nothing is formatted here; see search_general for pages of full
+    results. Bypasses the result cache.
+    """
+    refs: List[List[Union[str, int]]] = []
 
     logger.info(f"Performing general search for: '{query_string}'")
 
@@ -420,117 +542,250 @@ def search_general(query_string: str) -> Dict[str, List[Dict[str, any]]]:
     
     if is_single_japanese_char: 
         logger.info(f"Query '{query_string}' is a single Kanji. Fetching detailed Kanji info.")
-        kanji_detail_data = search_kanji(query_string)
-        if kanji_detail_data:
-            all_results.append({
-                "type": "kanji_detail",
-                "data": kanji_detail_data
-            })
-            processed_entry_keys.add(( (query_string,), (query_string,), tuple(kanji_detail_data.get("meanings", [])[:1]) ))
-
+        if search_kanji(query_string):
+            refs.append(["kanji_detail", query_string])
 
+    is_ascii_query = all(ord(c) < 128 for c in query_string)
+    is_text_query = not query_string.startswith("id#") and not any(c in query_string for c in "%_@")
+    matched_as_character = False
     try:
-        lookup_results = jam.lookup(query_string) 
-        
-        entries_to_process = []
-        if lookup_results and lookup_results.entries:
-            logger.info(f"Found {len(lookup_results.entries)} entries for query '{query_string}'")
-            entries_to_process.extend(lookup_results.entries)
-
-        is_ascii_query = all(ord(c) < 128 for c in query_string)
-        
-        if is_ascii_query and query_string and not is_single_japanese_char and not entries_to_process:
-            logger.info(f"Initial lookup for '{query_string}' yielded no results. Attempting English-specific search '{query_string}%eng'.")
-            eng_lookup_results = jam.lookup(f"{query_string}%eng")
-            if eng_lookup_results and eng_lookup_results.entries:
-                logger.info(f"Found {len(eng_lookup_results.entries)} entries from English-specific search for '{query_string}%eng'")
-                entries_to_process.extend(eng_lookup_results.entries)
-            else:
-                logger.info(f"English-specific search for '{query_string}%eng' also yielded no results.")
-        
-        if entries_to_process:
-            logger.info(f"Processing {len(entries_to_process)} total entries for query '{query_string}'.")
-            for entry in entries_to_process:
-                formatted_entry = _format_entry_for_frontend(entry)
-                
-                key_kanji = tuple(sorted(formatted_entry["kanji_forms"]))
-                key_kana = tuple(sorted(formatted_entry["kana_forms"]))
-                first_gloss = ""
-                if formatted_entry["senses"] and formatted_entry["senses"][0]["glosses"]:
-                    first_gloss = formatted_entry["senses"][0]["glosses"][0]
-                
-                entry_key = (key_kanji, key_kana, first_gloss)
-
-                if entry_key not in processed_entry_keys:
-                    all_results.append({
-                        "type": "word",
-                        "data": formatted_entry
-                    })
-                    processed_entry_keys.add(entry_key)
+        # built, when missing, before checking out a connection: building one
+        # takes another connection from the same pool
+        core = get_word_core()
+        gloss_index = get_gloss_index() if is_ascii_query and is_text_query else None
+        reading_index = get_reading_index() if len(query_string) == 1 else None
+
+        with dictionary_pool.connection() as conn:
+            conn.row_factory = None
+            idseqs = _matching_entry_ids(conn, query_string)
+            if idseqs:
+                logger.info(f"Found {len(idseqs)} entries for query '{query_string}'")
+
+            gloss_matches: Dict[int, GlossMatch] = {}
+
+            romaji_forms: Set[str] = set()
+            romaji_kana = romaji_to_hiragana(query_string) if is_ascii_query and is_text_query else None
+            if romaji_kana:
+                romaji_forms.add(romaji_kana)
+                kana_idseqs = _matching_entry_ids(conn, romaji_kana)
+                logger.info(f"Found {len(kana_idseqs)} entries for '{query_string}' read as '{romaji_kana}'")
+                idseqs = list(dict.fromkeys(idseqs + kana_idseqs))
+
+            if gloss_index is not None:
+                gloss_matches = gloss_index.search(query_string)
+                logger.info(f"Found {len(gloss_matches)} entries from the English gloss index for '{query_string}'")
+                idseqs = list(dict.fromkeys(idseqs + list(gloss_matches)))
+            elif is_ascii_query and query_string and not is_single_japanese_char and not idseqs:
+                logger.info(f"Initial lookup for '{query_string}' yielded no results. Attempting English-specific search '{query_string}%eng'.")
+                idseqs = _matching_entry_ids(conn, f"{query_string}%eng")
+                if idseqs:
+                    logger.info(f"Found {len(idseqs)} entries from English-specific search for '{query_string}%eng'")
                 else:
-                    logger.info(f"Skipping duplicate-like entry for key: {entry_key}")
+                    logger.info(f"English-specific search for '{query_string}%eng' also yielded no results.")
 
-        elif lookup_results and lookup_results.chars: 
-            if not any(r['type'] == 'kanji_detail' and r['data']['kanji'] == query_string for r in all_results):
-                logger.info(f"Query '{query_string}' matched as a character by general lookup. Fetching detailed Kanji info.")
-                kanji_detail_data = search_kanji(query_string) 
-                if kanji_detail_data:
-                     all_results.append({
-                        "type": "kanji_detail",
-                        "data": kanji_detail_data
-                    })
-                     processed_entry_keys.add(( (query_string,), (query_string,), tuple(kanji_detail_data.get("meanings", [])[:1]) ))
+            if idseqs:
+                refs.extend(["word", idseq] for idseq in _rank_entry_ids(conn, core, {query_string}, idseqs, gloss_matches, romaji_forms))
+            elif reading_index is not None and not refs and reading_index.get(query_string) is not None:
+                matched_as_character = True
 
+        # search_kanji checks out its own connection
+        if matched_as_character:
+            logger.info(f"Query '{query_string}' matched as a character by general lookup. Fetching detailed Kanji info.")
+            if search_kanji(query_string):
+                refs.append(["kanji_detail", query_string])
 
     except Exception as e:
-        logger.error(f"Error during general Jamdict lookup for '{query_string}': {e}", exc_info=True)
+        logger.error(f"Error during general dictionary lookup for '{query_string}': {e}", exc_info=True)
 
-    logger.info(f"General search for '{query_string}' yielded {len(all_results)} results.")
-    return {"results": all_results}
+    logger.info(f"General search for '{query_string}' yielded {len(refs)} results.")
+    return refs
 
 
-if __name__ == '__main__':
-    # some tests
-    if not logger.hasHandlers(): 
-        logging.basicConfig(level=logging.DEBUG) 
-        logging.getLogger('jamdict').setLevel(logging.INFO)
-        logging.getLogger('puchikarui').setLevel(logging.INFO)
-        logger.info("Logging set to DEBUG for __main__, INFO for jamdict/puchikarui.")
-    
-    test_kanji_list = ["日", "男"] 
-    for test_k in test_kanji_list:
-        logger.info(f"--- Testing Kanji: {test_k} ---")
-        info = search_kanji(test_k)
-        if info:
-            logger.info(f"  Kanji: {info.get('kanji')}")
-            logger.info(f"  Meanings: {', '.join(info.get('meanings', []))[:100]}") 
-            logger.info(f"  OnYomi: {info.get('onYomi')}")
-            logger.info(f"  KunYomi: {info.get('kunYomi')}")
-            logger.info(f"  Examples ({len(info.get('examples',[]))}):")
-            for ex in info.get('examples', [])[:2]: 
-                logger.info(f"    - {ex.get('word')} ({ex.get('reading')}): {ex.get('meaning')}")
-            logger.info(f"  Similar ({len(info.get('similar',[]))}):")
-            for sim in info.get('similar', [])[:2]: 
-                logger.info(f"    - {sim.get('kanji')} (Reason: {sim.get('reason')})")
-            logger.info(f"  Sentences ({len(info.get('sentences',[]))}):")
-            for sent in info.get('sentences', [])[:1]: 
-                logger.info(f"    - JP: {sent.get('japanese')}, EN: {sent.get('english')}")
-        else:
-            logger.info(f"No information found or error for {test_k}")
-        logger.info("-------------------------")
-
-    logger.info("--- Testing General Search ---")
-    test_queries = ["食べる", "たべる", "eat", "日", "日本", "kaisha", "会社", "水", "water", "mizu"]
-    for query in test_queries:
-        logger.info(f"--- General search for: {query} ---")
-        general_results = search_general(query)
-        logger.info(f"Found {len(general_results.get('results', []))} results.")
-        for res_idx, res_item in enumerate(general_results.get('results', [])[:3]): 
-            logger.info(f"  Result {res_idx+1} Type: {res_item.get('type')}")
-            if res_item.get('type') == 'word':
-                logger.info(f"    Word: K:{res_item['data'].get('kanji_forms')}, R:{res_item['data'].get('kana_forms')}")
-                if res_item['data'].get('senses'):
-                    logger.info(f"    Sense1: {res_item['data']['senses'][0].get('glosses')[:2]}") 
-            elif res_item.get('type') == 'kanji_detail':
-                logger.info(f"    Kanji: {res_item['data'].get('kanji')}, Meanings: {res_item['data'].get('meanings')[:2]}")
-        logger.info("-------------------------")
\ No newline at end of file
+kanji_cache = SearchResultCache("kanji", config.SEARCH_CACHE_MAX_ENTRIES, config.SEARCH_CACHE_MAX_BYTES)
+general_cache = SearchResultCache("general", config.SEARCH_CACHE_MAX_ENTRIES, config.SEARCH_CACHE_MAX_BYTES)
+
+
+def search_kanji(search_term: str) -> Union[Dict[str, any], None]:
+    """
+    Returns detailed info for a single kanji, served from the result cache
+    when possible. The returned dict is shared and must not be modified.
+    """
+    if not search_term:
+        return None
+    store = get_kanji_store()
+    if store is not None:
+        stored = store.get(search_term)
+        if stored is not None:
+            return stored
+    return kanji_cache.get_or_compute(normalize_query(search_term), compute_kanji_info)
+
+
+def _parse_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        offset = int(cursor)
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        raise ValueError(f"Invalid cursor: '{cursor}'")
+    return offset
+
+
+@stage("general_format")
+def _format_general_page(refs: List[List[Union[str, int]]]) -> List[Dict[str, any]]:
+    # common words are formatted straight from the word core; jamdict builds the rest
+    core = get_word_core()
+    words: Dict[int, Dict[str, any]] = {}
+    missing = [key for ref_type, key in refs if ref_type == "word"]
+    if core is not None:
+        core_entries, missing = core.split(missing)
+        words = {idseq: entry.to_dict() for idseq, entry in core_entries.items()}
+    if missing:
+        jam = get_jam()
+        with dictionary_pool.jamdict_context(jam.jmdict) as ctx:
+            for idseq in missing:
+                entry = jam.jmdict.get_entry(idseq, ctx=ctx)
+                if entry is not None:
+                    words[idseq] = _format_entry_for_frontend(entry)
+
+    results: List[Dict[str, any]] = []
+    for ref_type, key in refs:
+        if ref_type == "kanji_detail":
+            kanji_detail_data = search_kanji(key)
+            if kanji_detail_data:
+                results.append({"type": "kanji_detail", "data": kanji_detail_data})
+        elif key in words:
+            results.append({"type": "word", "data": words[key]})
+    return results
+
+
+def search_general(query_string: str, limit: int = DEFAULT_GENERAL_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, any]:
+    """
+    General search over words, kanji, kana and English, one page at a time.
+    The ranked match list is served from the result cache when possible and
+    only the requested page is formatted. cursor is the next_cursor of the
+    previous page, or None for the first one.
+
+    Raises ValueError for a cursor this function did not hand out.
+    """
+    offset = _parse_cursor(cursor)
+    limit = max(1, min(limit, MAX_GENERAL_PAGE_SIZE))
+    refs = general_cache.get_or_compute(normalize_query(query_string), compute_general_search)
+
+    page = refs[offset:offset + limit]
+    next_offset = offset + len(page)
+    has_more = next_offset < len(refs)
+    return {
+        "results": _format_general_page(page),
+        "total": len(refs),
+        "has_more": has_more,
+        "next_cursor": str(next_offset) if has_more else None,
+    }
+
+
+@stage("kanji_batch_examples")
+def _fetch_example_words(kanji_literals: List[str]) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Example words for several kanji at once: candidate entries come from the
+    word index, then their forms and first glosses are fetched with one
+    set-based query per table instead of one lookup per entry.
+    """
+    word_index = get_word_index()
+    candidates = {k: list(word_index.entries_for_kanji(k)[:MAX_WORD_ENTRIES_PER_KANJI]) for k in kanji_literals}
+    all_ids = sorted({idseq for ids in candidates.values() for idseq in ids})
+
+    kanji_forms: Dict[int, List[str]] = {}
+    kana_forms: Dict[int, List[str]] = {}
+    first_gloss: Dict[int, str] = {}
+    with dictionary_pool.connection() as conn:
+        for offset in range(0, len(all_ids), SQL_IN_CHUNK_SIZE):
+            chunk = all_ids[offset:offset + SQL_IN_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT idseq, text FROM Kanji WHERE idseq IN ({placeholders}) ORDER BY ID", chunk):
+                kanji_forms.setdefault(row["idseq"], []).append(row["text"])
+            for row in conn.execute(f"SELECT idseq, text FROM Kana WHERE idseq IN ({placeholders}) ORDER BY ID", chunk):
+                kana_forms.setdefault(row["idseq"], []).append(row["text"])
+            rows = conn.execute(
+                f"SELECT s.idseq, g.text FROM Sense s JOIN SenseGloss g ON g.sid = s.ID"
+                f" WHERE s.idseq IN ({placeholders}) ORDER BY s.ID, g.rowid",
+                chunk,
+            )
+            for row in rows:
+                first_gloss.setdefault(row["idseq"], row["text"])
+
+    examples: Dict[str, List[Dict[str, str]]] = {}
+    for kanji_literal, ids in candidates.items():
+        words: List[Dict[str, str]] = []
+        processed_words: Set[str] = set()
+        for idseq in ids:
+            word_display = next((text for text in kanji_forms.get(idseq, []) if text and kanji_literal in text), "")
+            if not word_display or word_display in processed_words:
+                continue
+            readings = kana_forms.get(idseq)
+            words.append({
+                "word": word_display,
+                "reading": readings[0] if readings and readings[0] else "",
+                "meaning": first_gloss.get(idseq, ""),
+            })
+            processed_words.add(word_display)
+            if len(words) >= 7:
+                break
+        examples[kanji_literal] = words
+    return examples
+
+
+def search_kanji_batch(kanji_literals: List[str]) -> Dict[str, Union[Dict[str, any], None]]:
+    """
+    Kanji details for many characters at once, e.g. every kanji in an OCR
+    result. Prebuilt-store and cache hits are used as-is; the rest are
+    resolved together from the in-memory reading index plus set-based SQL
+    for example words. Characters that are not kanji map to None.
+
+    jamdict_data ships no example sentences, so batch results always have an
+    empty sentences list, the same as search_kanji returns with that data.
+    """
+    results: Dict[str, Union[Dict[str, any], None]] = {}
+    pending: List[str] = []
+    store = get_kanji_store()
+    for literal in dict.fromkeys(kanji_literals):
+        if store is not None:
+            stored = store.get(literal)
+            if stored is not None:
+                results[literal] = stored
+                continue
+        cached = kanji_cache.peek(normalize_query(literal), _MISSING)
+        if cached is not _MISSING:
+            results[literal] = cached
+            continue
+        pending.append(literal)
+
+    if not pending:
+        return results
+
+    reading_index = get_reading_index()
+    found = [literal for literal in pending if reading_index.get(literal) is not None]
+    for literal in pending:
+        results.setdefault(literal, None)
+
+    try:
+        examples = _fetch_example_words(found)
+    except Exception as e:
+        logger.error(f"Error fetching example words for kanji batch: {e}", exc_info=True)
+        examples = {}
+
+    for literal in found:
+        info = reading_index.get(literal)
+        results[literal] = KanjiInfo(
+            kanji=literal,
+            meanings=list(info.meanings),
+            onYomi=list(info.on_yomi),
+            kunYomi=list(info.kun_yomi),
+            strokeCount=info.stroke_count,
+            jlptLevel=get_jlpt_level_approx(info.grade),
+            frequency=info.freq or 0,
+            examples=examples.get(literal, []),
+            sentences=[],
+            similar=_find_similar_kanji(literal, list(info.on_yomi), list(info.kun_yomi)),
+        ).to_dict()
+    return results
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+import unicodedata
+import threading
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """NFC-normalises a query and collapses runs of whitespace."""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+def _estimate_size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class SearchResultCache:
+    """
+    Bounded LRU memoization for dictionary searches, limited by entry count
+    and by the approximate JSON size of the cached results. Concurrent misses
+    for the same key share one computation (single-flight).
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Returns a cached value without computing it on a miss."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+    def get_or_compute(self, key: str, compute: Callable[[str], Any]) -> Any:
+        if not self.enabled:
+            return compute(key)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                generation = self._generation
+            else:
+                self.shared += 1
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = compute(key)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        size = _estimate_size(value)
+        with self._lock:
+            self._inflight.pop(key, None)
+            # skip storing if the cache was invalidated while computing
+            if generation == self._generation:
+                self._store(key, value, size)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """
+        Drops one query, or every entry when key is None. Returns how many
+        entries were dropped. The key is normalized the way lookups are.
+        """
+        if key is not None:
+            key = normalize_query(key)
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return dropped
+            cached = self._entries.pop(key, None)
+            if cached is None:
+                return 0
+            self._bytes -= cached[1]
+            return 1
+
+    def _store(self, key: str, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared": self.shared,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.shared) / lookups if lookups else 0.0,
+                "in_flight": len(self._inflight),
+            }
@@ -0,0 +1,250 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+import threading
+import heapq
+import logging
+import time
+import re
+
+import jaconv
+
+from app.services.dictionary_db import dictionary_pool
+from app.services.kanji_index import priority_score
+from app.services.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# completions returned when the caller does not ask for a number, and the cap
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+# prefix ranges wider than this get their best completions precomputed
+_WIDE_RANGE = 2048
+# candidates kept per precomputed prefix; extra room because one entry can match through several forms
+_PRECOMPUTED_TOP = MAX_SUGGESTIONS * 4
+_PREFIX_END = "\U0010ffff"
+
+_ROMAJI = re.compile(r"^[a-z'\-]+$")
+# consonants typed so far for a syllable that is not finished yet, e.g. the "b" in "tab"
+_PENDING_CONSONANTS = re.compile(r"[bcdfghjklmnpqrstvwxyz]+$")
+_SMALL_KANA = "ゃゅょぁぃぅぇぉ"
+# text made only of these is already NFKC-normal and has nothing for jaconv.normalize to fold
+_NORMALIZED_TEXT = re.compile(r"^[\u3041-\u3096\u30a1-\u30fa\u30fc\u4e00-\u9fff0-9a-zA-Z]*$")
+
+
+def _build_syllables() -> List[Tuple[str, str]]:
+    hiragana = [chr(code) for code in range(ord("ぁ"), ord("ゖ") + 1)]
+    syllables = [(kana, jaconv.kana2alphabet(kana)) for kana in hiragana]
+    syllables += [(kana + small, jaconv.kana2alphabet(kana + small)) for kana in hiragana for small in _SMALL_KANA]
+    return [(kana, romaji) for kana, romaji in syllables if romaji.isascii() and romaji.isalpha()]
+
+
+_SYLLABLES = _build_syllables()
+
+
+def normalize_kana_input(text: str) -> str:
+    """
+    jaconv's NFKC normalization (half-width kana to full width, full-width
+    ASCII to half width), then katakana to hiragana and lower case. Index
+    keys go through the same folding.
+    """
+    text = text.strip()
+    if not _NORMALIZED_TEXT.match(text):
+        text = jaconv.normalize(text)
+    return jaconv.kata2hira(text).lower()
+
+
+def romaji_to_hiragana(text: str) -> Optional[str]:
+    """Converts a complete romaji word to hiragana, or returns None if it is not one."""
+    split = _split_romaji(normalize_kana_input(text))
+    if split is None:
+        return None
+    kana, pending = split
+    if pending == "n":
+        kana, pending = kana + "ん", ""
+    return kana if kana and not pending else None
+
+
+def _split_romaji(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits romaji being typed into the hiragana of its finished syllables and
+    the consonants of the syllable still being typed: "tab" -> ("た", "b").
+    """
+    if not _ROMAJI.match(text):
+        return None
+    match = _PENDING_CONSONANTS.search(text)
+    pending = match.group(0) if match else ""
+    finished = text[:len(text) - len(pending)]
+    # an n before another consonant is a finished ん: "shinb" -> ("しん", "b")
+    if len(pending) >= 2 and pending[0] == "n" and pending[1] not in "ny":
+        finished += pending[0]
+        pending = pending[1:]
+    # a doubled consonant is a small tsu: "kitt" -> ("きっ", "t")
+    if len(pending) >= 2 and pending[0] == pending[1] and pending[0] != "n":
+        finished += pending[0]
+        pending = pending[1:]
+    kana = jaconv.alphabet2kana(finished) if finished else ""
+    if any(not ("ぁ" <= char <= "ゟ" or char == "ー") for char in kana):
+        return None
+    return kana, pending
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over every JMdict kanji and kana form: keys are
+    normalized forms in one sorted list, so the forms starting with a prefix
+    are one contiguous range found by binary search. Each form carries a
+    packed rank (priority score, length, idseq) so a range's best forms are
+    the smallest ranks in it.
+    """
+
+    def __init__(self, keys: List[str], texts: List[str], ranks: array, idseqs: array):
+        self._keys = keys
+        self._texts = texts
+        self._ranks = ranks
+        self._idseqs = idseqs
+        self._precomputed: Dict[str, List[int]] = {}
+        for length in (1, 2):
+            for prefix in sorted({key[:length] for key in keys if len(key) >= length}):
+                lo, hi = self._range(prefix)
+                if hi - lo > _WIDE_RANGE:
+                    self._precomputed[prefix] = heapq.nsmallest(_PRECOMPUTED_TOP, range(lo, hi), key=ranks.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + _PREFIX_END)
+
+    def _best_positions(self, prefix: str, count: int) -> List[int]:
+        precomputed = self._precomputed.get(prefix)
+        if precomputed is not None:
+            return precomputed[:count]
+        lo, hi = self._range(prefix)
+        return heapq.nsmallest(count, range(lo, hi), key=self._ranks.__getitem__)
+
+    def complete(self, query: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Tuple[int, str]]:
+        """
+        Best-ranked (idseq, form) completions of a query, one per entry. Kana,
+        kanji and romaji input all work; romaji may end in an unfinished
+        syllable ("tab" completes to たべる).
+        """
+        prefix = normalize_kana_input(query)
+        if not prefix:
+            return []
+        prefixes = [prefix]
+        split = _split_romaji(prefix)
+        if split is not None:
+            kana, pending = split
+            if pending:
+                prefixes = [kana + syllable for syllable, romaji in _SYLLABLES if romaji.startswith(pending)]
+            elif kana:
+                prefixes = [kana]
+
+        wanted = limit * 4
+        positions = [position for p in prefixes for position in self._best_positions(p, wanted)]
+        positions.sort(key=self._ranks.__getitem__)
+
+        completions: List[Tuple[int, str]] = []
+        seen = set()
+        for position in positions:
+            idseq = self._idseqs[position]
+            if idseq in seen:
+                continue
+            seen.add(idseq)
+            completions.append((idseq, self._texts[position]))
+            if len(completions) >= limit:
+                break
+        return completions
+
+
+def _pack_rank(score: int, length: int, idseq: int) -> int:
+    return (score << 48) | (min(length, 0xFFFF) << 32) | idseq
+
+
+def build_suggest_index() -> SuggestIndex:
+    """Builds the suggest index from every JMdict kanji and kana form and its priority tags."""
+    start = time.perf_counter()
+    rows: List[Tuple[str, str, int, int]] = []
+    with dictionary_pool.connection() as conn:
+        conn.row_factory = None
+        for table, tag_table in (("Kanji", "KJP"), ("Kana", "KNP")):
+            tags_by_form: Dict[int, List[str]] = {}
+            for form_id, tag in conn.execute(f"SELECT kid, text FROM {tag_table}"):
+                tags_by_form.setdefault(form_id, []).append(tag)
+            for form_id, idseq, text in conn.execute(f"SELECT ID, idseq, text FROM {table}"):
+                if not text:
+                    continue
+                key = normalize_kana_input(text)
+                if key == text:
+                    # most forms are their own key, share the string
+                    key = text
+                rank = _pack_rank(priority_score(tags_by_form.get(form_id, ())), len(key), idseq)
+                rows.append((key, text, rank, idseq))
+
+    rows.sort()
+    index = SuggestIndex(
+        keys=[row[0] for row in rows],
+        texts=[row[1] for row in rows],
+        ranks=array("q", (row[2] for row in rows)),
+        idseqs=array("q", (row[3] for row in rows)),
+    )
+    logger.info(f"Built suggest index over {len(index)} forms in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+_suggest_index: Optional[SuggestIndex] = None
+_suggest_index_lock = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """Returns the process-wide suggest index, building it on first use."""
+    global _suggest_index
+    if _suggest_index is None:
+        with _suggest_index_lock:
+            if _suggest_index is None:
+                _suggest_index = build_suggest_index()
+    return _suggest_index
+
+
+@stage("suggest")
+def suggest(query: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict[str, str]]:
+    """
+    Top completions for search-as-you-type: each entry's headword, first
+    reading and first English gloss, plus the form that matched the input.
+    """
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+    completions = get_suggest_index().complete(query, limit)
+    if not completions:
+        return []
+
+    idseqs = [idseq for idseq, _ in completions]
+    placeholders = ",".join("?" * len(idseqs))
+    headwords: Dict[int, str] = {}
+    readings: Dict[int, str] = {}
+    glosses: Dict[int, str] = {}
+    with dictionary_pool.connection() as conn:
+        for row in conn.execute(f"SELECT idseq, text FROM Kanji WHERE idseq IN ({placeholders}) ORDER BY ID", idseqs):
+            headwords.setdefault(row["idseq"], row["text"])
+        for row in conn.execute(f"SELECT idseq, text FROM Kana WHERE idseq IN ({placeholders}) ORDER BY ID", idseqs):
+            readings.setdefault(row["idseq"], row["text"])
+        # lang is checked here: filtering on it in SQL makes SQLite scan the SenseGloss lang index
+        rows = conn.execute(
+            f"SELECT s.idseq, g.lang, g.text FROM Sense s JOIN SenseGloss g ON g.sid = s.ID"
+            f" WHERE s.idseq IN ({placeholders}) ORDER BY s.ID, g.rowid",
+            idseqs,
+        )
+        for row in rows:
+            if row["lang"] == "eng":
+                glosses.setdefault(row["idseq"], row["text"])
+
+    return [
+        {
+            "word": headwords.get(idseq) or readings.get(idseq) or matched,
+            "reading": readings.get(idseq, ""),
+            "meaning": glosses.get(idseq, ""),
+            "matched": matched,
+            "idseq": str(idseq),
+        }
+        for idseq, matched in completions
+    ]
@@ -0,0 +1,174 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import threading
+import logging
+import time
+import sys
+
+from app import config
+from app.services.dictionary_db import dictionary_pool
+from app.services.kanji_index import priority_score
+
+logger = logging.getLogger(__name__)
+
+# entries with a priority tag on any kanji or kana form
+_CORE_IDSEQS = (
+    "SELECT f.idseq FROM Kanji f JOIN KJP p ON p.kid = f.ID"
+    " UNION SELECT f.idseq FROM Kana f JOIN KNP p ON p.kid = f.ID"
+)
+
+
+class CoreSense:
+    """One sense of a core entry, holding only what general search shows."""
+
+    __slots__ = ("glosses", "pos", "misc", "field")
+
+    def __init__(self):
+        self.glosses: Tuple[str, ...] = ()
+        self.pos: Tuple[str, ...] = ()
+        self.misc: Tuple[str, ...] = ()
+        self.field: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        # same shape as search._format_sense_for_frontend. The database does have
+        # dialect rows, but that function reads a `dial` attribute jamdict's
+        # senses don't have, so its dialect list is always empty; this one is kept
+        # empty too so core and fallback entries come back identical
+        return {
+            "glosses": list(self.glosses),
+            "pos": list(self.pos),
+            "misc": list(self.misc),
+            "field": list(self.field),
+            "dialect": [],
+            "examples": [],
+        }
+
+
+class CoreEntry:
+    """A common JMdict word as general search ranks and formats it."""
+
+    __slots__ = ("idseq", "kanji_forms", "kana_forms", "priority", "senses")
+
+    def __init__(self, idseq: int):
+        self.idseq = idseq
+        self.kanji_forms: Tuple[str, ...] = ()
+        self.kana_forms: Tuple[str, ...] = ()
+        self.priority = 0
+        self.senses: Tuple[CoreSense, ...] = ()
+
+    @property
+    def forms(self) -> Tuple[str, ...]:
+        return self.kanji_forms + self.kana_forms
+
+    @property
+    def first_gloss(self) -> str:
+        return next((gloss for sense in self.senses for gloss in sense.glosses), "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The entry in search._format_entry_for_frontend's shape."""
+        return {
+            "idseq": str(self.idseq),
+            "kanji_forms": list(self.kanji_forms),
+            "kana_forms": list(self.kana_forms),
+            "senses": [sense.to_dict() for sense in self.senses],
+        }
+
+
+class WordCore:
+    """
+    The common-word subset of JMdict (every entry with a priority tag on
+    one of its forms) held in memory, so ranking and formatting the words
+    most searches return needs no SQL and no jamdict object graphs. Records
+    use __slots__ and tuples of interned strings: part-of-speech labels,
+    tags and many glosses repeat across thousands of entries.
+    """
+
+    def __init__(self, entries: Dict[int, CoreEntry]):
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, idseq: int) -> Optional[CoreEntry]:
+        return self._entries.get(idseq)
+
+    def split(self, idseqs: List[int]) -> Tuple[Dict[int, CoreEntry], List[int]]:
+        """The core entries among idseqs, and the idseqs that are not in the core."""
+        hits: Dict[int, CoreEntry] = {}
+        misses: List[int] = []
+        for idseq in idseqs:
+            entry = self._entries.get(idseq)
+            if entry is not None:
+                hits[idseq] = entry
+            else:
+                misses.append(idseq)
+        return hits, misses
+
+
+def build_word_core() -> WordCore:
+    """Loads every priority-tagged JMdict entry, a handful of queries in all."""
+    start = time.perf_counter()
+    intern = sys.intern
+    with dictionary_pool.connection() as conn:
+        conn.row_factory = None
+        entries = {idseq: CoreEntry(idseq) for (idseq,) in conn.execute(_CORE_IDSEQS)}
+
+        # rows come in ID (rowid) order, the order jamdict's get_entry reads them in
+        tags: Dict[int, Set[str]] = {}
+        for table, tag_table, attribute in (("Kanji", "KJP", "kanji_forms"), ("Kana", "KNP", "kana_forms")):
+            forms: Dict[int, List[str]] = {}
+            seen_forms: Set[int] = set()
+            rows = conn.execute(
+                f"SELECT f.idseq, f.text, f.ID, p.text FROM {table} f LEFT JOIN {tag_table} p ON p.kid = f.ID"
+                f" WHERE f.idseq IN ({_CORE_IDSEQS}) ORDER BY f.ID"
+            )
+            for idseq, text, form_id, tag in rows:
+                if form_id not in seen_forms:
+                    seen_forms.add(form_id)
+                    if text:
+                        forms.setdefault(idseq, []).append(intern(text))
+                if tag:
+                    tags.setdefault(idseq, set()).add(tag)
+            for idseq, texts in forms.items():
+                setattr(entries[idseq], attribute, tuple(texts))
+        for idseq, entry in entries.items():
+            entry.priority = priority_score(tags.get(idseq, ()))
+
+        senses: Dict[int, CoreSense] = {}
+        senses_by_entry: Dict[int, List[CoreSense]] = {}
+        for sense_id, idseq in conn.execute(f"SELECT ID, idseq FROM Sense WHERE idseq IN ({_CORE_IDSEQS}) ORDER BY ID"):
+            sense = senses[sense_id] = CoreSense()
+            senses_by_entry.setdefault(idseq, []).append(sense)
+        for idseq, entry_senses in senses_by_entry.items():
+            entries[idseq].senses = tuple(entry_senses)
+
+        for table, attribute in (("SenseGloss", "glosses"), ("pos", "pos"), ("misc", "misc"), ("field", "field")):
+            values: Dict[int, List[str]] = {}
+            rows = conn.execute(
+                f"SELECT sid, text FROM {table} WHERE sid IN (SELECT ID FROM Sense WHERE idseq IN ({_CORE_IDSEQS}))"
+                f" ORDER BY rowid"
+            )
+            for sense_id, text in rows:
+                if text:
+                    values.setdefault(sense_id, []).append(intern(text))
+            for sense_id, texts in values.items():
+                setattr(senses[sense_id], attribute, tuple(texts))
+
+    core = WordCore(entries)
+    logger.info(f"Built word core for {len(core)} common JMdict entries in {time.perf_counter() - start:.2f}s")
+    return core
+
+
+_word_core: Optional[WordCore] = None
+_word_core_lock = threading.Lock()
+
+
+def get_word_core() -> Optional[WordCore]:
+    """Returns the process-wide word core, building it on first use, or None when WORD_CORE is off."""
+    global _word_core
+    if not config.WORD_CORE:
+        return None
+    if _word_core is None:
+        with _word_core_lock:
+            if _word_core is None:
+                _word_core = build_word_core()
+    return _word_core
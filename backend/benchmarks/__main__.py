@@ -0,0 +1,104 @@
+"""
+Benchmarks for the search and OCR hot paths, run from backend/:
+
+    python -m benchmarks run [--suite NAME ...] [--output results.json]
+    python -m benchmarks compare base.json head.json [--threshold 0.1]
+    python -m benchmarks ocr-backends [--backend NAME ...] [--output results.json]
+    python -m benchmarks memory [--workers N] [--output results.json]
+
+`run` writes one JSON document with throughput, p50/p95/p99 latency,
+dictionary query counts, per-stage time and peak RSS per suite; `compare`
+diffs two of them and exits non-zero when a metric regressed by more than
+the threshold. `ocr-backends` runs the OCR corpus through each inference
+backend and prints accuracy next to latency. `memory` starts the
+pre-forking launcher (app/serve.py) with and without preloading and prints
+the RSS, PSS and USS of every worker.
+"""
+from pathlib import Path
+import argparse
+import logging
+import json
+import sys
+
+from app.services.ocr_backends import BACKENDS
+from benchmarks.memory import compare_preload, memory_table
+from benchmarks.harness import (
+    DEFAULT_KANJI_SAMPLE, SUITES, backend_table, compare_ocr_backends, compare_results, run_benchmarks,
+)
+
+parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Search and OCR benchmarks.")
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+run_parser = subparsers.add_parser("run", help="run the benchmark suites and print or save the results")
+run_parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run, repeatable (default: all)")
+run_parser.add_argument("--output", type=Path, help="write the JSON here instead of stdout")
+run_parser.add_argument("--repeat", type=int, default=1, help="timed passes over each corpus")
+run_parser.add_argument("--warmup", type=int, default=3, help="untimed calls before each suite")
+run_parser.add_argument("--kanji-sample", type=int, default=DEFAULT_KANJI_SAMPLE,
+                        help="kanji taken evenly from the JLPT list; 0 runs all of them")
+run_parser.add_argument("--font", help="font with Japanese glyphs for the synthetic OCR images")
+run_parser.add_argument("--result-cache", action="store_true",
+                        help="keep the search result caches on (off by default so every call is computed)")
+
+compare_parser = subparsers.add_parser("compare", help="diff two result files")
+compare_parser.add_argument("base", type=Path)
+compare_parser.add_argument("head", type=Path)
+compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression (0.1 = 10%%)")
+
+backends_parser = subparsers.add_parser("ocr-backends", help="compare OCR backends on accuracy and latency")
+backends_parser.add_argument("--backend", action="append", choices=BACKENDS, help="backend to run, repeatable (default: all)")
+backends_parser.add_argument("--output", type=Path, help="also write the JSON here")
+backends_parser.add_argument("--repeat", type=int, default=1, help="timed passes over the images")
+backends_parser.add_argument("--warmup", type=int, default=3, help="untimed calls before timing")
+backends_parser.add_argument("--font", help="font with Japanese glyphs for the synthetic OCR images")
+
+memory_parser = subparsers.add_parser("memory", help="per-worker memory of app.serve with and without preloading")
+memory_parser.add_argument("--workers", type=int, default=4)
+memory_parser.add_argument("--requests", type=int, default=200, help="search requests sent before measuring")
+memory_parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for the workers to settle")
+memory_parser.add_argument("--output", type=Path, help="also write the JSON here")
+
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO)
+
+if args.command == "run":
+    options = {
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "kanji_sample": args.kanji_sample or None,
+        "font": args.font,
+        "result_cache": args.result_cache,
+    }
+    results = json.dumps(run_benchmarks(args.suite or SUITES, options), ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(results + "\n", encoding="utf-8")
+    else:
+        print(results)
+elif args.command == "ocr-backends":
+    options = {
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "kanji_sample": None,
+        "font": args.font,
+        "result_cache": False,
+    }
+    comparison = compare_ocr_backends(args.backend or BACKENDS, options)
+    if args.output:
+        args.output.write_text(json.dumps(comparison, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print("\n".join(backend_table(comparison)))
+elif args.command == "memory":
+    comparison = compare_preload(args.workers, args.requests, args.timeout)
+    if args.output:
+        args.output.write_text(json.dumps(comparison, indent=2) + "\n", encoding="utf-8")
+    print("\n".join(memory_table(comparison)))
+else:
+    report, regressions = compare_results(
+        json.loads(args.base.read_text(encoding="utf-8")),
+        json.loads(args.head.read_text(encoding="utf-8")),
+        args.threshold,
+    )
+    print("\n".join(report))
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+        print("\n".join(regressions))
+        sys.exit(1)
@@ -0,0 +1,119 @@
+"""
+The fixed inputs the benchmarks run against: the JLPT kanji list, the mixed
+general-search queries and the lines rendered into synthetic OCR images, all
+under benchmarks/corpus/.
+"""
+from pathlib import Path
+from typing import List, Optional, Tuple
+import hashlib
+import base64
+import io
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+# checked in order when no --font is given; any font with Japanese glyphs works
+FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
+    "/usr/share/fonts/truetype/takao-gothic/TakaoGothic.ttf",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/msgothic.ttc",
+    "C:/Windows/Fonts/YuGothM.ttc",
+]
+
+_FONT_SIZE = 32
+_MARGIN = 24
+_LINE_SPACING = 6
+_SNIP_SUFFIX = "-snip"
+
+
+def _read_rows(name: str) -> List[List[str]]:
+    rows = []
+    for line in (CORPUS_DIR / name).read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            rows.append(line.split("\t"))
+    return rows
+
+
+def load_jlpt_kanji() -> List[Tuple[str, int]]:
+    """(kanji, old JLPT level) pairs, easiest level first."""
+    return [(literal, int(level)) for literal, level in _read_rows("jlpt_kanji.txt")]
+
+
+def load_queries() -> List[Tuple[str, str]]:
+    """(kind, query) pairs for general search."""
+    return [(kind, query) for kind, query in _read_rows("queries.txt")]
+
+
+def load_ocr_lines() -> List[Tuple[str, str]]:
+    """(layout, text) pairs, one per synthetic OCR image."""
+    return [(layout, text) for layout, text in _read_rows("ocr_lines.txt")]
+
+
+def evenly_spaced(items: List, count: Optional[int]) -> List:
+    """A deterministic sample of count items spread across the list, or all of them."""
+    if count is None or count >= len(items):
+        return list(items)
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+
+def find_font(path: Optional[str] = None) -> Optional[Path]:
+    """The font to render OCR images with: the given path, BENCH_FONT, or the first installed candidate."""
+    for candidate in [path, os.environ.get("BENCH_FONT")] + FONT_CANDIDATES:
+        if candidate and Path(candidate).is_file():
+            return Path(candidate)
+    return None
+
+
+def font_fingerprint(font_path: Path) -> str:
+    """Short content hash so results rendered with different fonts are not compared blindly."""
+    return hashlib.sha256(font_path.read_bytes()).hexdigest()[:12]
+
+
+def render_text_image(text: str, layout: str, font_path: Path) -> Image.Image:
+    """
+    Draws black text on a white speech-bubble-like canvas. Vertical layout
+    stacks characters top to bottom the way manga bubbles do. A "-snip"
+    suffix renders the bubble at twice the size on a wide blank page, like
+    a loose snip of a high-DPI screen.
+    """
+    if layout.endswith(_SNIP_SUFFIX):
+        bubble = render_text_image(text, layout[:-len(_SNIP_SUFFIX)], font_path)
+        bubble = bubble.resize((bubble.width * 2, bubble.height * 2), Image.LANCZOS)
+        page = Image.new("RGB", (bubble.width * 3, bubble.height + 400), "white")
+        page.paste(bubble, (bubble.width, 200))
+        return page
+
+    font = ImageFont.truetype(str(font_path), _FONT_SIZE)
+    if layout == "vertical":
+        width = _FONT_SIZE + 2 * _MARGIN
+        height = len(text) * (_FONT_SIZE + _LINE_SPACING) + 2 * _MARGIN
+    else:
+        width = int(font.getlength(text)) + 2 * _MARGIN
+        height = _FONT_SIZE + 2 * _MARGIN
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle((2, 2, width - 3, height - 3), radius=_MARGIN // 2, outline="black", width=2)
+    if layout == "vertical":
+        for i, char in enumerate(text):
+            x = _MARGIN + (_FONT_SIZE - font.getlength(char)) / 2
+            draw.text((x, _MARGIN + i * (_FONT_SIZE + _LINE_SPACING)), char, font=font, fill="black")
+    else:
+        draw.text((_MARGIN, _MARGIN), text, font=font, fill="black")
+    return image
+
+
+def to_data_url(image: Image.Image) -> str:
+    """PNG-encodes an image as the data URL /api/scan accepts."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
@@ -0,0 +1,349 @@
+"""
+Runs the search and OCR hot paths over the fixed corpus and summarises each
+suite as throughput, latency percentiles, dictionary query counts, per-stage
+time and peak RSS.
+
+Every suite runs in its own freshly spawned process, so peak RSS and cold
+caches are per suite and do not depend on which suites ran before it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import multiprocessing
+import subprocess
+import platform
+import resource
+import logging
+import time
+import sys
+import os
+
+from benchmarks import corpus
+
+# bump whenever a field of the result JSON changes meaning
+RESULT_FORMAT_VERSION = 1
+
+SUITES = ["search_kanji", "search_general", "perform_ocr_on_image"]
+# compute_kanji_info takes up to a few seconds per kanji, so the full JLPT list is opt-in
+DEFAULT_KANJI_SAMPLE = 200
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * fraction // 1))
+    return sorted_values[int(rank) - 1]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two strings, by character."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _measure(call: Callable[[Any], Any], items: List[Any], repeat: int,
+             expected: Optional[List[Any]] = None) -> Dict[str, Any]:
+    from app.services.metrics import begin_request_timings
+
+    latencies: List[float] = []
+    queries: List[int] = []
+    stages: Dict[str, float] = {}
+    errors = 0
+    exact_matches = 0
+    char_errors = 0
+    expected_chars = 0
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for i, item in enumerate(items):
+            # each call is timed like a request so stage() and query counts attach to it
+            timings = begin_request_timings()
+            call_started_at = time.perf_counter()
+            try:
+                output = call(item)
+                if expected is not None:
+                    exact_matches += output == expected[i]
+                    char_errors += edit_distance(output, expected[i])
+                    expected_chars += len(expected[i])
+            except Exception as e:
+                errors += 1
+                logging.getLogger(__name__).warning(f"Benchmark call failed for {item!r}: {e}")
+            latencies.append(time.perf_counter() - call_started_at)
+            queries.append(timings.queries)
+            for name, seconds in timings.stages.items():
+                stages[name] = stages.get(name, 0.0) + seconds
+    wall_seconds = time.perf_counter() - started_at
+
+    calls = len(latencies)
+    latencies.sort()
+    result = {
+        "calls": calls,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(calls / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / calls * 1000, 3) if calls else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if calls else 0.0,
+        },
+        "queries": {
+            "total": sum(queries),
+            "mean": round(sum(queries) / calls, 2) if calls else 0.0,
+            "max": max(queries, default=0),
+        },
+        "stages_ms_per_call": {name: round(seconds / calls * 1000, 3) for name, seconds in sorted(stages.items())},
+    }
+    if expected is not None:
+        # accuracy guards: a faster OCR path must not read worse
+        result["exact_matches"] = exact_matches
+        result["char_error_rate"] = round(char_errors / expected_chars, 4) if expected_chars else 0.0
+    return result
+
+
+class _Skipped(Exception):
+    """A suite that cannot run here, e.g. OCR without a Japanese font or manga_ocr."""
+
+
+# a suite's callable, its inputs, the expected outputs if checked, and details for the report
+_Suite = Tuple[Callable[[Any], Any], List[Any], Optional[List[Any]], Dict[str, Any]]
+
+
+def _setup_search() -> Dict[str, Any]:
+    from app.services.gloss_index import get_gloss_index
+    from app.services.kanji_index import get_reading_index, get_word_index
+    from app.services.kanji_store import get_kanji_store
+    from app.services.search import get_jam
+    from app.services.word_core import get_word_core
+
+    # the same warm-up the server's lifespan does, minus building missing artifacts
+    get_jam()
+    get_reading_index()
+    get_word_index()
+    get_word_core()
+    return {
+        "kanji_store": get_kanji_store() is not None,
+        "gloss_index": get_gloss_index() is not None,
+    }
+
+
+def _run_search_kanji(options: Dict[str, Any]) -> _Suite:
+    from app.services.search import search_kanji
+
+    details = _setup_search()
+    kanji = corpus.evenly_spaced(corpus.load_jlpt_kanji(), options["kanji_sample"])
+    details["kanji"] = len(kanji)
+    return search_kanji, [literal for literal, _ in kanji], None, details
+
+
+def _run_search_general(options: Dict[str, Any]) -> _Suite:
+    from app.services.search import search_general
+
+    details = _setup_search()
+    queries = corpus.load_queries()
+    details["queries_by_kind"] = {}
+    for kind, _ in queries:
+        details["queries_by_kind"][kind] = details["queries_by_kind"].get(kind, 0) + 1
+    return search_general, [query for _, query in queries], None, details
+
+
+def _run_ocr(options: Dict[str, Any]) -> _Suite:
+    font_path = corpus.find_font(options.get("font"))
+    if font_path is None:
+        raise _Skipped("no font with Japanese glyphs found; pass --font or set BENCH_FONT")
+    from app.services.scan import get_ocr_engine, perform_ocr_on_image
+
+    try:
+        # manga_ocr and torch are only imported when the model loads
+        get_ocr_engine()
+    except ImportError as e:
+        raise _Skipped(f"OCR dependencies are not installed: {e}")
+    except FileNotFoundError as e:
+        raise _Skipped(str(e))
+
+    lines = corpus.load_ocr_lines()
+    images = [corpus.to_data_url(corpus.render_text_image(text, layout, font_path)) for layout, text in lines]
+
+    details = {
+        "images": len(images),
+        "font": font_path.name,
+        "font_sha256": corpus.font_fingerprint(font_path),
+        "backend": get_ocr_engine().name,
+    }
+    return perform_ocr_on_image, images, [text for _, text in lines], details
+
+
+_SUITE_SETUP = {
+    "search_kanji": _run_search_kanji,
+    "search_general": _run_search_general,
+    "perform_ocr_on_image": _run_ocr,
+}
+
+
+def run_suite(name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one suite in the current process. Meant to be called in a fresh one."""
+    logging.basicConfig(level=logging.WARNING)
+    if options.get("ocr_backend"):
+        os.environ["OCR_BACKEND"] = options["ocr_backend"]
+    if not options["result_cache"]:
+        # measure the computation, not cache hits on repeated queries
+        os.environ["SEARCH_CACHE_MAX_ENTRIES"] = "0"
+
+    started_at = time.perf_counter()
+    try:
+        call, items, expected, details = _SUITE_SETUP[name](options)
+    except _Skipped as e:
+        return {"skipped": str(e)}
+    setup_seconds = time.perf_counter() - started_at
+    # app.services.search sets its own level on import; per-query logging would swamp the output
+    logging.getLogger("app.services.search").setLevel(logging.WARNING)
+
+    # one untimed pass over a few items to settle lazy imports and first-use costs
+    for item in items[:options["warmup"]]:
+        try:
+            call(item)
+        except Exception:
+            pass
+
+    result = _measure(call, items, options["repeat"], expected)
+    result["setup_seconds"] = round(setup_seconds, 3)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["details"] = details
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment(options: Dict[str, Any]) -> Dict[str, Any]:
+    from app import config
+    from app.services.dictionary_db import jamdict_data_version
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "jamdict_data_version": jamdict_data_version(),
+        "ocr_backend": config.OCR_BACKEND,
+        "ocr_preprocess": bool(config.OCR_PREPROCESS),
+        "ocr_split_regions": bool(config.OCR_SPLIT_REGIONS),
+        "result_cache": options["result_cache"],
+        "repeat": options["repeat"],
+    }
+
+
+def run_benchmarks(suites: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs each suite in a spawned process and collects the results into one JSON-ready dict."""
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for name in suites:
+        logging.getLogger(__name__).info(f"Running benchmark suite {name}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(run_suite, name, options).result()
+
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "environment": _environment(options),
+        "suites": results,
+    }
+
+
+def compare_ocr_backends(backends: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs the OCR suite once per backend, each in its own process, for an accuracy-vs-latency table."""
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        logging.getLogger(__name__).info(f"Running the OCR suite with the {backend} backend")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[backend] = pool.submit(run_suite, "perform_ocr_on_image", {**options, "ocr_backend": backend}).result()
+
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "environment": _environment(options),
+        "backends": results,
+    }
+
+
+def backend_table(comparison: Dict[str, Any]) -> List[str]:
+    """One line per backend: accuracy next to latency and memory."""
+    lines = [f"{'backend':<12} {'exact':>7} {'CER':>7} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>7} {'RSS MB':>8}"]
+    for backend, result in comparison["backends"].items():
+        if "skipped" in result:
+            lines.append(f"{backend:<12} skipped: {result['skipped']}")
+            continue
+        lines.append(
+            f"{backend:<12} {result['exact_matches']:>3}/{result['calls']:<3} {result['char_error_rate']:>7.2%}"
+            f" {result['latency_ms']['p50']:>9.1f} {result['latency_ms']['p95']:>9.1f}"
+            f" {result['throughput_per_second']:>7.2f} {result['peak_rss_mb']:>8.1f}"
+        )
+    return lines
+
+
+# (path into a suite's result, True when a larger value is worse)
+COMPARED_METRICS = [
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("latency_ms", "p99"), True),
+    (("throughput_per_second",), False),
+    (("queries", "mean"), True),
+    (("peak_rss_mb",), True),
+    (("exact_matches",), False),
+    (("char_error_rate",), True),
+]
+
+
+def _lookup(result: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_results(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    Compares two result files metric by metric. Returns a printable report
+    and the subset of lines for metrics that got worse by more than threshold
+    (a fraction: 0.1 is 10%).
+    """
+    report: List[str] = []
+    regressions: List[str] = []
+    for name, head_result in head.get("suites", {}).items():
+        base_result = base.get("suites", {}).get(name)
+        if base_result is None or "skipped" in base_result or "skipped" in head_result:
+            report.append(f"{name}: not compared")
+            continue
+        for path, larger_is_worse in COMPARED_METRICS:
+            before, after = _lookup(base_result, path), _lookup(head_result, path)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            line = f"{name} {'.'.join(path)}: {before:g} -> {after:g} ({change:+.1%})"
+            report.append(line)
+            worse = change if larger_is_worse else -change
+            if worse > threshold:
+                regressions.append(line)
+    return report, regressions
@@ -0,0 +1,157 @@
+"""
+Per-worker memory of the pre-forking launcher (app/serve.py), with and
+without preloading. Each variant starts `python -m app.serve`, waits for
+the workers to settle, sends some search traffic and then reads every
+worker's memory from /proc/<pid>/smaps_rollup (Linux only):
+
+- rss: resident pages, shared ones included, as top and ps show it
+- pss: resident pages with each shared page split between its sharers;
+  summed over the processes it is the real footprint
+- uss: pages private to the process, what it costs to add one more worker
+"""
+from typing import Any, Dict, List, Optional
+import urllib.request
+import subprocess
+import signal
+import json
+import socket
+import time
+import sys
+import os
+
+from benchmarks import corpus
+
+# a worker counts as settled once its PSS moved by less than this between samples
+_SETTLE_TOLERANCE = 0.01
+_SETTLE_SAMPLES = 3
+_SAMPLE_INTERVAL_S = 1.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def process_memory_mb(pid: int) -> Dict[str, float]:
+    """rss, pss and uss of one process in MB, from /proc/<pid>/smaps_rollup."""
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss": round(fields.get("Rss", 0) / 1024, 1),
+        "pss": round(fields.get("Pss", 0) / 1024, 1),
+        "uss": round(uss / 1024, 1),
+    }
+
+
+def _wait_until_settled(launcher: subprocess.Popen, workers: int, timeout: float) -> List[int]:
+    deadline = time.monotonic() + timeout
+    previous: Optional[Dict[int, float]] = None
+    stable = 0
+    while time.monotonic() < deadline:
+        if launcher.poll() is not None:
+            raise RuntimeError(f"app.serve exited with status {launcher.returncode}")
+        pids = _children(launcher.pid)
+        if len(pids) == workers:
+            current = {pid: process_memory_mb(pid)["pss"] for pid in pids}
+            if previous is not None and previous.keys() == current.keys() and all(
+                abs(current[pid] - previous[pid]) <= _SETTLE_TOLERANCE * max(previous[pid], 1.0) for pid in pids
+            ):
+                stable += 1
+                if stable >= _SETTLE_SAMPLES:
+                    return pids
+            else:
+                stable = 0
+            previous = current
+        time.sleep(_SAMPLE_INTERVAL_S)
+    raise TimeoutError(f"Workers did not settle within {timeout:.0f}s")
+
+
+def _send_search_traffic(port: int, requests: int) -> int:
+    queries = [query for _, query in corpus.load_queries()]
+    answered = 0
+    for i in range(requests):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/api/search/general",
+            data=json.dumps({"query": queries[i % len(queries)]}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            answered += 1
+        except OSError:
+            pass
+    return answered
+
+
+def measure_launcher(workers: int, preload: bool, requests: int, timeout: float) -> Dict[str, Any]:
+    """Starts app.serve with the given worker count and reports the memory of its parent and each worker."""
+    port = _free_port()
+    command = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    if not preload:
+        command.append("--no-preload")
+    started_at = time.perf_counter()
+    launcher = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_settled(launcher, workers, timeout)
+        ready_s = time.perf_counter() - started_at
+        answered = _send_search_traffic(port, requests)
+        pids = _wait_until_settled(launcher, workers, timeout)
+        per_worker = [process_memory_mb(pid) for pid in pids]
+        parent = process_memory_mb(launcher.pid)
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        try:
+            launcher.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            launcher.kill()
+
+    return {
+        "preload": preload,
+        "workers": workers,
+        "seconds_until_settled": round(ready_s, 1),
+        "search_requests_answered": answered,
+        "parent": parent,
+        "per_worker": per_worker,
+        "worker_mean": {
+            key: round(sum(worker[key] for worker in per_worker) / len(per_worker), 1) for key in ("rss", "pss", "uss")
+        },
+        # PSS adds up across processes, so this is the whole deployment's footprint
+        "total_pss": round(parent["pss"] + sum(worker["pss"] for worker in per_worker), 1),
+    }
+
+
+def compare_preload(workers: int, requests: int, timeout: float) -> Dict[str, Any]:
+    """Measures the launcher once without and once with preloading."""
+    return {
+        "search_only": os.environ.get("SEARCH_ONLY", "0") not in ("", "0"),
+        "ocr_backend": os.environ.get("OCR_BACKEND", "torch"),
+        "variants": [measure_launcher(workers, preload, requests, timeout) for preload in (False, True)],
+    }
+
+
+def memory_table(comparison: Dict[str, Any]) -> List[str]:
+    """Plain-text rows of a compare_preload result."""
+    rows = [f"{'variant':<12} {'workers':>7} {'rss/worker':>11} {'pss/worker':>11} {'uss/worker':>11} {'parent pss':>11} {'total pss':>10}"]
+    for variant in comparison["variants"]:
+        mean = variant["worker_mean"]
+        rows.append(
+            f"{'preload' if variant['preload'] else 'no preload':<12} {variant['workers']:>7} "
+            f"{mean['rss']:>9.1f}MB {mean['pss']:>9.1f}MB {mean['uss']:>9.1f}MB "
+            f"{variant['parent']['pss']:>9.1f}MB {variant['total_pss']:>8.1f}MB"
+        )
+    return rows
@@ -0,0 +1,156 @@
+from PIL import Image
+import asyncio
+
+import pytest
+
+from app.services import ocr_jobs as jobs_module
+from app.services.ocr_jobs import CANCELLED, DONE, PENDING, JobRejectedError, OcrJobManager
+
+IMAGE = Image.new("L", (8, 8))
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Stands in for the scheduler: every job waits until the test sets release."""
+    class StubEngine:
+        release: asyncio.Event
+
+        async def recognize(self, image):
+            await self.release.wait()
+            return "テキスト"
+
+    stub = StubEngine()
+    monkeypatch.setattr(jobs_module, "recognize_image", stub.recognize)
+    monkeypatch.setattr(jobs_module, "_REAP_INTERVAL_S", 0.01)
+    return stub
+
+
+def _manager(**settings) -> OcrJobManager:
+    return OcrJobManager(
+        max_pending=settings.get("max_pending", 8),
+        max_per_client=settings.get("max_per_client", 8),
+        abandon_after_s=settings.get("abandon_after_s", 60),
+        result_ttl_s=settings.get("result_ttl_s", 60),
+    )
+
+
+def test_admission_limits_per_client_and_in_total(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        manager = _manager(max_pending=3, max_per_client=2)
+        rejected = manager.stats()["rejected"]
+        first = [manager.submit(IMAGE, "a"), manager.submit(IMAGE, "a")]
+
+        with pytest.raises(JobRejectedError, match="this client") as client_limit:
+            manager.submit(IMAGE, "a")
+        assert client_limit.value.retry_after >= 1
+        first.append(manager.submit(IMAGE, "b"))
+        with pytest.raises(JobRejectedError, match="queue is full"):
+            manager.submit(IMAGE, "c")
+
+        stats = manager.stats()
+        assert (stats["pending"], stats["clients_with_pending_jobs"]) == (3, 2)
+        assert stats["rejected"]["client_limit"] - rejected["client_limit"] == 1
+        assert stats["rejected"]["queue_full"] - rejected["queue_full"] == 1
+
+        engine.release.set()
+        for job in first:
+            await manager.wait(job, timeout=1)
+        assert [job.status for job in first] == [DONE] * 3
+        assert first[0].text == "テキスト"
+        # finished jobs free their slots
+        assert manager.stats()["pending"] == 0
+        assert manager.submit(IMAGE, "a").status == PENDING
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_jobs_free_their_slots(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        manager = _manager(max_per_client=1)
+        job = manager.submit(IMAGE, "a")
+        manager.cancel(job.id)
+        await manager.wait(job, timeout=1)
+
+        assert job.status == CANCELLED
+        assert manager.stats()["pending"] == 0
+        manager.submit(IMAGE, "a")
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_the_reaper_cancels_unwatched_jobs_and_keeps_watched_ones(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        manager = _manager(abandon_after_s=0.05)
+        abandoned_before = manager.stats()["cancelled"]["abandoned"]
+        manager.start()
+        abandoned = manager.submit(IMAGE, "a")
+        watched = manager.submit(IMAGE, "b")
+
+        # the watcher outlives the abandon time several times over
+        await manager.wait(watched, timeout=0.3)
+
+        assert abandoned.status == CANCELLED
+        assert watched.status == PENDING
+        assert manager.stats()["cancelled"]["abandoned"] - abandoned_before == 1
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_polling_keeps_a_job_alive(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        manager = _manager(abandon_after_s=0.05)
+        manager.start()
+        job = manager.submit(IMAGE, "a")
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            manager.get(job.id)
+
+        assert job.status == PENDING
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_the_reaper_forgets_finished_jobs_after_their_ttl(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        engine.release.set()
+        manager = _manager(result_ttl_s=0.05)
+        manager.start()
+        job = manager.submit(IMAGE, "a")
+        await manager.wait(job, timeout=1)
+        assert manager.get(job.id) is job
+
+        await asyncio.sleep(0.2)
+        assert manager.get(job.id) is None
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_watchers_are_counted_while_they_wait(engine):
+    async def scenario():
+        engine.release = asyncio.Event()
+        manager = _manager()
+        job = manager.submit(IMAGE, "a")
+        waiters = [asyncio.create_task(manager.wait(job, timeout=1)) for _ in range(2)]
+        timed_out = asyncio.create_task(manager.wait(job, timeout=0.01))
+        await asyncio.sleep(0)
+        assert job.watchers == 3
+
+        await timed_out
+        assert job.watchers == 2
+        engine.release.set()
+        await asyncio.gather(*waiters)
+        assert job.watchers == 0
+        assert job.status == DONE
+        await manager.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,112 @@
+from PIL import Image
+from typing import List
+import asyncio
+
+from app.services.metrics import RequestTimings, begin_request_timings, stage
+from app.services.ocr_scheduler import OcrScheduler
+
+
+def _image(label: int) -> Image.Image:
+    # the stub engine reads the label back from the width
+    return Image.new("L", (label, 1))
+
+
+def _stub_engine(batches: List[List[int]]):
+    def batch_fn(images: List[Image.Image]) -> List[str]:
+        batches.append([image.width for image in images])
+        return [f"text {image.width}" for image in images]
+    return batch_fn
+
+
+def test_batches_are_capped_and_each_caller_gets_its_own_text():
+    batches: List[List[int]] = []
+
+    async def scenario():
+        scheduler = OcrScheduler(max_batch_size=2, max_wait_ms=50, batch_fn=_stub_engine(batches))
+        try:
+            return await asyncio.gather(*(scheduler.submit(_image(label)) for label in range(1, 6)))
+        finally:
+            await scheduler.stop()
+
+    texts = asyncio.run(scenario())
+
+    assert texts == [f"text {label}" for label in range(1, 6)]
+    assert all(len(batch) <= 2 for batch in batches)
+    assert sorted(label for batch in batches for label in batch) == [1, 2, 3, 4, 5]
+
+
+def test_requests_given_up_before_their_batch_starts_are_dropped():
+    batches: List[List[int]] = []
+
+    async def scenario():
+        scheduler = OcrScheduler(max_batch_size=8, max_wait_ms=50, batch_fn=_stub_engine(batches))
+        try:
+            gone = asyncio.create_task(scheduler.submit(_image(1)))
+            kept = asyncio.create_task(scheduler.submit(_image(2)))
+            # let both reach the queue, then give up on one while the batch is still filling
+            await asyncio.sleep(0.01)
+            gone.cancel()
+            return await kept
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(scenario()) == "text 2"
+    assert batches == [[2]]
+
+
+def test_a_batch_made_only_of_given_up_requests_is_not_run():
+    batches: List[List[int]] = []
+
+    async def scenario():
+        scheduler = OcrScheduler(max_batch_size=8, max_wait_ms=20, batch_fn=_stub_engine(batches))
+        try:
+            gone = asyncio.create_task(scheduler.submit(_image(1)))
+            await asyncio.sleep(0.005)
+            gone.cancel()
+            await asyncio.sleep(0.05)
+            return await scheduler.submit(_image(3))
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(scenario()) == "text 3"
+    assert batches == [[3]]
+
+
+def test_engine_errors_reach_every_caller_in_the_batch():
+    def failing_batch_fn(images: List[Image.Image]) -> List[str]:
+        raise RuntimeError("model exploded")
+
+    async def scenario():
+        scheduler = OcrScheduler(max_batch_size=4, max_wait_ms=20, batch_fn=failing_batch_fn)
+        try:
+            return await asyncio.gather(*(scheduler.submit(_image(label)) for label in (1, 2)), return_exceptions=True)
+        finally:
+            await scheduler.stop()
+
+    errors = asyncio.run(scenario())
+
+    assert all("model exploded" in str(error) for error in errors)
+
+
+def test_batch_stages_are_added_to_every_submitting_request():
+    def timed_batch_fn(images: List[Image.Image]) -> List[str]:
+        with stage("ocr_generate"):
+            return [str(image.width) for image in images]
+
+    async def submit_as_request(scheduler: OcrScheduler, label: int) -> RequestTimings:
+        timings = begin_request_timings()
+        await scheduler.submit(_image(label))
+        return timings
+
+    async def scenario():
+        scheduler = OcrScheduler(max_batch_size=4, max_wait_ms=20, batch_fn=timed_batch_fn)
+        try:
+            # each task runs in its own copy of the context, as each request does
+            return await asyncio.gather(*(submit_as_request(scheduler, label) for label in (1, 2)))
+        finally:
+            await scheduler.stop()
+
+    first, second = asyncio.run(scenario())
+
+    assert "ocr_generate" in first.stages
+    assert first.stages == second.stages
@@ -0,0 +1,88 @@
+import pytest
+
+from app.services import search
+from app.services.gloss_index import GlossMatch
+from app.services.search_cache import SearchResultCache
+from app.services.word_core import CoreEntry, CoreSense, WordCore
+
+
+@pytest.fixture
+def refs(monkeypatch):
+    """Serves 7 ranked word refs for any query and formats a page as its keys, no dictionary needed."""
+    ranked = [["word", idseq] for idseq in range(1000, 1007)]
+    monkeypatch.setattr(search, "general_cache", SearchResultCache("test", max_entries=16, max_bytes=1 << 20))
+    monkeypatch.setattr(search, "compute_general_search", lambda query: ranked)
+    monkeypatch.setattr(search, "_format_general_page", lambda page: [key for _, key in page])
+    return ranked
+
+
+def test_cursors_walk_every_result_exactly_once(refs):
+    pages, cursor = [], None
+    while True:
+        page = search.search_general("日本", limit=3, cursor=cursor)
+        pages.append(page["results"])
+        assert page["total"] == 7
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            break
+        cursor = page["next_cursor"]
+
+    assert pages == [[1000, 1001, 1002], [1003, 1004, 1005], [1006]]
+
+
+def test_a_page_ending_exactly_at_the_last_result_has_no_more(refs):
+    page = search.search_general("日本", limit=4, cursor="3")
+
+    assert page["results"] == [1003, 1004, 1005, 1006]
+    assert page["has_more"] is False
+    assert page["next_cursor"] is None
+
+
+def test_a_cursor_past_the_end_gives_an_empty_last_page(refs):
+    page = search.search_general("日本", limit=3, cursor="50")
+
+    assert page == {"results": [], "total": 7, "has_more": False, "next_cursor": None}
+
+
+def test_limits_are_clamped_to_the_page_size_bounds(refs):
+    assert search.search_general("日本", limit=0)["results"] == [1000]
+    assert search.search_general("日本", limit=search.MAX_GENERAL_PAGE_SIZE + 100)["has_more"] is False
+
+
+@pytest.mark.parametrize("cursor, offset", [(None, 0), ("", 0), ("0", 0), ("12", 12)])
+def test_cursor_decoding(cursor, offset):
+    assert search._parse_cursor(cursor) == offset
+
+
+@pytest.mark.parametrize("cursor", ["-1", "abc", "1.5"])
+def test_cursors_not_handed_out_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        search._parse_cursor(cursor)
+
+
+def _core_entry(idseq: int, kanji: str, kana: str, gloss: str, priority: int) -> CoreEntry:
+    entry = CoreEntry(idseq)
+    entry.kanji_forms, entry.kana_forms, entry.priority = (kanji,), (kana,), priority
+    sense = CoreSense()
+    sense.glosses = (gloss,)
+    entry.senses = (sense,)
+    return entry
+
+
+def test_english_words_that_are_also_romaji_rank_the_english_meaning_first():
+    # "name" read as romaji is なめ; 嘗める is the more common word but not what was asked for
+    entries = {
+        1: _core_entry(1, "嘗め", "なめ", "lick", 0),
+        2: _core_entry(2, "名", "な", "name", 5),
+        3: _core_entry(3, "名前", "なまえ", "name", 5),
+        4: _core_entry(4, "指名", "しめい", "naming", 1),
+    }
+    gloss_matches = {
+        2: GlossMatch(exact=True, sense_index=0, score=-2.0),
+        3: GlossMatch(exact=True, sense_index=0, score=-2.0),
+        4: GlossMatch(exact=False, sense_index=0, score=-1.0),
+    }
+
+    ranked = search._rank_entry_ids(None, WordCore(entries), {"name"}, [1, 2, 3, 4], gloss_matches, romaji_forms={"なめ"})
+
+    assert ranked == [2, 3, 1, 4]
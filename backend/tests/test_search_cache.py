@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from app.services.search_cache import SearchResultCache, normalize_query
+
+
+def _cache(**limits) -> SearchResultCache:
+    return SearchResultCache("test", max_entries=limits.get("max_entries", 16), max_bytes=limits.get("max_bytes", 1 << 20))
+
+
+def _wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = _cache()
+    release = threading.Event()
+    calls = []
+
+    def compute(key):
+        calls.append(key)
+        release.wait(2)
+        return [key]
+
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(cache.get_or_compute, "日本", compute) for _ in range(5)]
+        _wait_for(lambda: cache.stats()["shared"] == 4)
+        release.set()
+        values = [future.result() for future in futures]
+
+    assert calls == ["日本"]
+    assert all(value is values[0] for value in values)
+    stats = cache.stats()
+    assert (stats["misses"], stats["shared"], stats["in_flight"]) == (1, 4, 0)
+    assert cache.get_or_compute("日本", compute) is values[0]
+    assert cache.stats()["hits"] == 1
+
+
+def test_a_failed_computation_reaches_every_waiter_and_is_not_cached():
+    cache = _cache()
+    release = threading.Event()
+
+    def compute(key):
+        release.wait(2)
+        raise RuntimeError("database gone")
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(cache.get_or_compute, "key", compute) for _ in range(3)]
+        _wait_for(lambda: cache.stats()["shared"] == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="database gone"):
+                future.result()
+
+    assert cache.peek("key") is None
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_a_result_computed_across_an_invalidation_is_not_stored():
+    cache = _cache()
+    started, release = threading.Event(), threading.Event()
+
+    def compute(key):
+        started.set()
+        release.wait(2)
+        return "stale"
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(cache.get_or_compute, "key", compute)
+        started.wait(2)
+        cache.invalidate()
+        release.set()
+        # the caller still gets its answer, it just is not kept
+        assert future.result() == "stale"
+
+    assert cache.peek("key") is None
+    assert cache.get_or_compute("key", lambda key: "fresh") == "fresh"
+    assert cache.peek("key") == "fresh"
+
+
+def test_invalidating_one_key_leaves_the_others_and_normalizes_it():
+    cache = _cache()
+    for query in ("日本", "本"):
+        cache.get_or_compute(normalize_query(query), lambda key: key)
+
+    assert cache.invalidate(" 日本 ") == 1
+    assert cache.peek("日本") is None
+    assert cache.peek("本") == "本"
+    assert cache.invalidate("日本") == 0
+
+
+def test_entries_are_evicted_least_recently_used_first():
+    cache = _cache(max_entries=2)
+    for key in ("a", "b"):
+        cache.get_or_compute(key, lambda key: key)
+    cache.peek("a")
+    cache.get_or_compute("c", lambda key: key)
+
+    assert cache.peek("b") is None
+    assert (cache.peek("a"), cache.peek("c")) == ("a", "c")
+    assert cache.stats()["evictions"] == 1
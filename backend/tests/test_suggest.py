@@ -0,0 +1,67 @@
+from array import array
+
+import pytest
+
+from app.services.suggest import SuggestIndex, _pack_rank, _split_romaji, normalize_kana_input, romaji_to_hiragana
+
+
+def _index(*forms) -> SuggestIndex:
+    """An index over (form, priority score, idseq) triples; a lower score ranks first."""
+    rows = sorted((normalize_kana_input(text), text, _pack_rank(score, len(text), idseq), idseq)
+                  for text, score, idseq in forms)
+    return SuggestIndex(
+        keys=[row[0] for row in rows],
+        texts=[row[1] for row in rows],
+        ranks=array("q", (row[2] for row in rows)),
+        idseqs=array("q", (row[3] for row in rows)),
+    )
+
+
+@pytest.mark.parametrize("text, split", [
+    ("tab", ("た", "b")),
+    ("tabe", ("たべ", "")),
+    ("ky", ("", "ky")),
+    ("kitt", ("きっ", "t")),
+    ("konn", ("こ", "nn")),
+    ("shinb", ("しん", "b")),
+])
+def test_romaji_splits_into_finished_kana_and_pending_consonants(text, split):
+    assert _split_romaji(text) == split
+
+
+@pytest.mark.parametrize("text", ["たべ", "tab1", "TAB"])
+def test_text_that_is_not_lower_case_romaji_does_not_split(text):
+    assert _split_romaji(text) is None
+
+
+@pytest.mark.parametrize("text, kana", [("taberu", "たべる"), ("kan", "かん"), ("Kitte", "きって"), ("tab", None)])
+def test_romaji_to_hiragana_only_converts_whole_words(text, kana):
+    assert romaji_to_hiragana(text) == kana
+
+
+def test_a_pending_consonant_completes_to_every_syllable_it_can_start():
+    index = _index(("たべる", 1, 1), ("タバコ", 2, 2), ("たびょう", 3, 3), ("たいへん", 0, 4), ("たつ", 0, 5))
+
+    completions = index.complete("tab")
+
+    assert [text for _, text in completions] == ["たべる", "タバコ", "たびょう"]
+
+
+def test_a_doubled_consonant_completes_after_a_small_tsu():
+    index = _index(("切手", 5, 1), ("きって", 1, 1), ("きつね", 0, 2), ("きっぷ", 2, 3))
+
+    assert index.complete("kitt") == [(1, "きって")]
+    assert index.complete("kip") == []
+
+
+def test_an_n_before_a_pending_consonant_is_a_finished_n():
+    index = _index(("しんぶん", 0, 1), ("しなもの", 0, 2))
+
+    assert index.complete("shinb") == [(1, "しんぶん")]
+
+
+def test_completions_keep_one_form_per_entry_and_respect_the_limit():
+    index = _index(("食べる", 0, 1), ("たべる", 1, 1), ("たべもの", 2, 2), ("たべすぎ", 3, 3))
+
+    assert index.complete("たべ", limit=2) == [(1, "たべる"), (2, "たべもの")]
+    assert index.complete("食") == [(1, "食べる")]